@@ -2,31 +2,43 @@
 
 from __future__ import annotations
 
+import functools
+import importlib
 import importlib.util
 import os
+import sys
+from dataclasses import dataclass
+from typing import Any
 
-from ._cleon import auth as _codex_auth, run  # type: ignore[import-not-found]  # Re-export PyO3 bindings
-from .magic import (
-    load_ipython_extension,
-    register_codex_magic,
-    register_magic,
-    use,
-    history_magic,
-    help as help_text,
-    stop as stop_session,
-    resume as resume_session,
-    status as status_info,
-    mode as mode_control,
-    add_mode as add_mode_entry,
-    default_mode as default_mode_entry,
-    reset as reset_runtime,
-    sessions as list_sessions,
-    refresh_auto_route,
-)
-from .backend import SharedSession
-from . import autoroute
+# ``cleon.settings`` is both a submodule and a public function; import the
+# submodule eagerly so a later first import of it cannot clobber the function.
 from .settings import settings as settings_store, _UNSET as _SETTINGS_UNSET
-from .oauth import login_claude
+
+# Public names resolved from their submodules on first attribute access
+# (PEP 562) so ``import cleon`` doesn't pull in IPython and the backends.
+_LAZY_EXPORTS: dict[str, tuple[str, str | None]] = {
+    "run": ("._cleon", "run"),
+    "load_ipython_extension": (".magic", "load_ipython_extension"),
+    "register_codex_magic": (".magic", "register_codex_magic"),
+    "register_magic": (".magic", "register_magic"),
+    "use": (".magic", "use"),
+    "history_magic": (".magic", "history_magic"),
+    "refresh_auto_route": (".magic", "refresh_auto_route"),
+    # Session helpers share their magic.py signatures, so they are re-exported
+    # directly instead of through wrapper functions.
+    "help": (".magic", "help"),
+    "stop": (".magic", "stop"),
+    "resume": (".magic", "resume"),
+    "status": (".magic", "status"),
+    "mode": (".magic", "mode"),
+    "add_mode": (".magic", "add_mode"),
+    "default_mode": (".magic", "default_mode"),
+    "reset": (".magic", "reset"),
+    "sessions": (".magic", "sessions"),
+    "SharedSession": (".backend", "SharedSession"),
+    "autoroute": (".autoroute", None),
+    "login_claude": (".oauth", "login_claude"),
+}
 
 __all__ = [
     "auth",
@@ -55,6 +67,27 @@ __all__ = [
 ]
 
 
+def __getattr__(name: str) -> Any:
+    spec = _LAZY_EXPORTS.get(name)
+    if spec is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = spec
+    module = importlib.import_module(module_name, __name__)
+    value = module if attr is None else getattr(module, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_EXPORTS) | set(__all__))
+
+
+@functools.lru_cache(maxsize=1)
+def _extension_installed() -> bool:
+    """Resolve the extension package once; cleared by install_extension()."""
+    return importlib.util.find_spec("cleon_cell_control") is not None
+
+
 def has_extension(*, verbose: bool = True) -> bool:
     """Check if cleon-jupyter-extension is installed and available.
 
@@ -62,7 +95,7 @@ def has_extension(*, verbose: bool = True) -> bool:
     If verbose=True (default), also displays status about whether the
     extension is loaded and reachable in the current notebook.
     """
-    installed = importlib.util.find_spec("cleon_cell_control") is not None
+    installed = _extension_installed()
 
     if verbose:
         _display_extension_status(installed)
@@ -238,11 +271,20 @@ def install_extension() -> None:
             print("   Run cleon.check_extension() to verify it's loaded.")
         return
 
-    # Determine install command based on environment
-    use_uv = _is_uv_environment()
+    # This command actually runs, so only use uv when it created the kernel's
+    # own venv, and point it at this interpreter; otherwise use its pip.
+    use_uv = _venv_created_by_uv()
 
     if use_uv:
-        cmd = ["uv", "pip", "install", "-U", "cleon-jupyter-extension"]
+        cmd = [
+            "uv",
+            "pip",
+            "install",
+            "--python",
+            sys.executable,
+            "-U",
+            "cleon-jupyter-extension",
+        ]
         cmd_str = "uv pip install -U cleon-jupyter-extension"
     else:
         cmd = [sys.executable, "-m", "pip", "install", "-U", "cleon-jupyter-extension"]
@@ -262,6 +304,8 @@ def install_extension() -> None:
 
     try:
         subprocess.check_call(cmd)
+        importlib.invalidate_caches()
+        _extension_installed.cache_clear()
 
         if use_html:
             display(
@@ -319,128 +363,174 @@ def install_extension() -> None:
             print(f"   Try manually: {fallback_cmd}")
 
 
-# Expose help() at top-level for convenience
-def help() -> None:  # type: ignore[override]
-    return help_text()
+def settings(key=_SETTINGS_UNSET, value=_SETTINGS_UNSET, **updates):
+    return settings_store(key=key, value=value, **updates)
 
 
-def stop(agent: str | None = None, *, force: bool = False) -> str | None:
-    return stop_session(agent=agent, force=force)
+def login(agent: str = "claude"):
+    from .oauth import login_claude
 
+    if agent.lower() in {"claude", "anthropic", "pi"}:
+        return login_claude()
+    raise ValueError(f"Unknown agent '{agent}'.")
 
-def resume(agent: str = "codex", session_id: str | None = None) -> str | None:
-    return resume_session(agent=agent, session_id=session_id)
 
+def auth(provider: str | None = None) -> None:
+    """Authenticate with the specified provider (defaults to claude/pi)."""
+    from .oauth import login_claude
 
-def status() -> dict[str, object]:
-    return status_info()
+    provider = provider or "claude"
+    if provider.lower() in {"claude", "anthropic", "pi"}:
+        return login_claude()
+    elif provider.lower() == "codex":
+        from ._cleon import auth as _codex_auth  # type: ignore[import-not-found]
 
+        return _codex_auth(provider)
+    else:
+        raise ValueError(f"Unknown provider '{provider}'. Supported: claude, codex")
 
-def mode(name: str | None = None, *, agent: str | None = None) -> str:
-    return mode_control(name=name, agent=agent)
 
+@dataclass
+class _State:
+    """Import-time bookkeeping that must survive ``importlib.reload(cleon)``."""
 
-def add_mode(name: str, template: str | None = None, *, agent: str | None = None):
-    return add_mode_entry(name=name, template=template, agent=agent)
+    auto_initialized: bool = False
+    extension_hint_shown: bool = False
+    version_check_done: bool = False
 
 
-def default_mode(name: str, *, agent: str | None = None):
-    return default_mode_entry(name=name, agent=agent)
+# Reuse the existing state on reload so auto-registration only ever runs once.
+_STATE: _State = globals().get("_STATE") or _State()
 
 
-def settings(key=_SETTINGS_UNSET, value=_SETTINGS_UNSET, **updates):
-    return settings_store(key=key, value=value, **updates)
+_CURRENT_VERSION: str | None = None
 
 
-def reset():
-    return reset_runtime()
+def _get_current_version() -> str:
+    """Get the currently installed version of cleon (looked up once)."""
+    global _CURRENT_VERSION
+    if _CURRENT_VERSION is None:
+        try:
+            from importlib.metadata import version
 
+            _CURRENT_VERSION = version("cleon")
+        except Exception:
+            _CURRENT_VERSION = "unknown"
+    return _CURRENT_VERSION
 
-def sessions():
-    return list_sessions()
 
+def _is_uv_environment() -> bool:
+    """Guess whether the user manages packages with uv.
 
-def login(agent: str = "claude"):
-    if agent.lower() in {"claude", "anthropic", "pi"}:
-        return login_claude()
-    raise ValueError(f"Unknown agent '{agent}'.")
+    Only picks the command printed in the upgrade notice, so a cheap
+    heuristic (UV_* variables or ``uv`` on PATH) is enough; no files are read.
+    Anything that runs an installer must use ``_venv_created_by_uv`` instead.
+    """
+    import shutil
 
+    return any(k.startswith("UV_") for k in os.environ) or bool(shutil.which("uv"))
 
-def auth(provider: str | None = None) -> None:
-    """Authenticate with the specified provider (defaults to claude/pi)."""
-    provider = provider or "claude"
-    if provider.lower() in {"claude", "anthropic", "pi"}:
-        return login_claude()
-    elif provider.lower() == "codex":
-        return _codex_auth(provider)
-    else:
-        raise ValueError(f"Unknown provider '{provider}'. Supported: claude, codex")
 
+def _venv_created_by_uv() -> bool:
+    """Whether this interpreter's venv was created by uv (and uv is available).
 
-_AUTO_INITIALIZED = False
+    uv records itself in pyvenv.cfg; a plain pip or conda environment has no
+    such key even when uv happens to be on PATH.
+    """
+    import shutil
 
+    if not shutil.which("uv"):
+        return False
+    try:
+        with open(os.path.join(sys.prefix, "pyvenv.cfg"), encoding="utf-8") as fh:
+            return any(line.partition("=")[0].strip() == "uv" for line in fh)
+    except OSError:
+        return False
 
-_EXTENSION_HINT_SHOWN = False
 
+_VERSION_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "cleon", "version_check.json"
+)
+_VERSION_CACHE_TTL = 24 * 60 * 60
 
-_VERSION_CHECK_DONE = False
 
+def _read_version_cache() -> str | None:
+    """Return the cached latest PyPI version if it was fetched within the TTL."""
+    import json
+    import time
 
-def _get_current_version() -> str:
-    """Get the currently installed version of cleon."""
     try:
-        from importlib.metadata import version
+        with open(_VERSION_CACHE_PATH, encoding="utf-8") as fh:
+            data = json.load(fh)
+        if time.time() - float(data.get("checked_at", 0)) >= _VERSION_CACHE_TTL:
+            return None
+        latest = data.get("latest")
+        return latest if isinstance(latest, str) and latest else None
+    except Exception:
+        return None
+
 
-        return version("cleon")
+def _write_version_cache(latest: str) -> None:
+    import json
+    import time
+
+    try:
+        os.makedirs(os.path.dirname(_VERSION_CACHE_PATH), exist_ok=True)
+        with open(_VERSION_CACHE_PATH, "w", encoding="utf-8") as fh:
+            json.dump({"checked_at": time.time(), "latest": latest}, fh)
     except Exception:
-        return "unknown"
+        pass
 
 
-def _is_uv_environment() -> bool:
-    """Detect if we're running in a uv-managed environment."""
-    import os
+def _is_newer_version(latest: str, current: str) -> bool:
+    """Compare PEP 440 versions, falling back to numeric release segments."""
+    try:
+        from packaging.version import InvalidVersion, Version
+    except ImportError:
 
-    # Check for UV_* environment variables
-    if any(k.startswith("UV_") for k in os.environ):
-        return True
+        def _release(v: str) -> tuple[int, ...]:
+            parts: list[int] = []
+            for part in v.split("."):
+                if not part.isdigit():
+                    break
+                parts.append(int(part))
+            return tuple(parts)
 
-    # Check if uv is in the path and this venv was created by uv
-    venv_path = os.environ.get("VIRTUAL_ENV", "")
-    if venv_path:
-        # uv creates a .uv marker or uses specific structure
-        uv_marker = os.path.join(venv_path, ".uv")
-        if os.path.exists(uv_marker):
-            return True
+        return _release(latest) > _release(current)
 
-    # Check if 'uv' command is available and recently used
     try:
-        import shutil
-
-        if shutil.which("uv"):
-            # Check pyvenv.cfg for uv signature
-            if venv_path:
-                cfg_path = os.path.join(venv_path, "pyvenv.cfg")
-                if os.path.exists(cfg_path):
-                    with open(cfg_path) as f:
-                        content = f.read()
-                        if "uv" in content.lower():
-                            return True
-    except Exception:
-        pass
+        return Version(latest) > Version(current)
+    except InvalidVersion:
+        return False
+
 
-    return False
+def _notify_if_outdated(current: str, latest: str) -> None:
+    if latest and latest != current and _is_newer_version(latest, current):
+        use_uv = _is_uv_environment()
+        cmd = "uv pip install -U cleon" if use_uv else "pip install -U cleon"
+        _render_upgrade_notice(current, latest, cmd, use_uv)
 
 
 def _check_for_updates() -> None:
-    """Check PyPI for newer version (runs 10% of the time)."""
-    global _VERSION_CHECK_DONE
-    if _VERSION_CHECK_DONE:
+    """Show an upgrade notice when a newer cleon is on PyPI.
+
+    Uses a 24h on-disk cache; PyPI is only queried when the cache is stale and
+    ``CLEON_CHECK_UPDATES=1`` is set.
+    """
+    if _STATE.version_check_done:
         return
-    _VERSION_CHECK_DONE = True
+    _STATE.version_check_done = True
 
-    import random
+    current = _get_current_version()
+    if current == "unknown":
+        return
+
+    cached = _read_version_cache()
+    if cached is not None:
+        _notify_if_outdated(current, cached)
+        return
 
-    if random.random() > 0.10:  # Only check 10% of the time
+    if not os.environ.get("CLEON_CHECK_UPDATES"):
         return
 
     import threading
@@ -450,10 +540,6 @@ def _check_for_updates() -> None:
             import urllib.request
             import json
 
-            current = _get_current_version()
-            if current == "unknown":
-                return
-
             # Fetch latest version from PyPI
             url = "https://pypi.org/pypi/cleon/json"
             req = urllib.request.Request(
@@ -463,24 +549,10 @@ def _check_for_updates() -> None:
                 data = json.loads(resp.read().decode())
                 latest = data.get("info", {}).get("version", "")
 
-            if not latest or latest == current:
+            if not latest:
                 return
-
-            # Compare versions
-            def _parse_version(v: str) -> tuple:
-                """Parse version string into comparable tuple."""
-                parts: list[int | str] = []
-                for part in v.split("."):
-                    try:
-                        parts.append(int(part))
-                    except ValueError:
-                        parts.append(part)
-                return tuple(parts)
-
-            if _parse_version(latest) > _parse_version(current):
-                use_uv = _is_uv_environment()
-                cmd = "uv pip install -U cleon" if use_uv else "pip install -U cleon"
-                _render_upgrade_notice(current, latest, cmd, use_uv)
+            _write_version_cache(latest)
+            _notify_if_outdated(current, latest)
 
         except Exception:
             # Silently fail - version check is non-critical
@@ -613,8 +685,11 @@ def _display_welcome_message() -> None:
 
 
 def _auto_register_magic() -> None:
-    global _AUTO_INITIALIZED, _EXTENSION_HINT_SHOWN
-    if _AUTO_INITIALIZED:
+    # A kernel has always imported IPython already; don't pull it in (and pay
+    # for it) in plain Python processes that merely have it installed.
+    if "IPython" not in sys.modules:
+        return
+    if _STATE.auto_initialized:
         return
     try:
         from IPython import get_ipython  # type: ignore
@@ -622,6 +697,8 @@ def _auto_register_magic() -> None:
 
         ip = get_ipython()
         if ip is not None:
+            from .magic import refresh_auto_route, register_magic, use
+
             try:
                 use(ipython=ip, quiet=True)
             except Exception as exc:
@@ -637,16 +714,21 @@ def _auto_register_magic() -> None:
                 print(f"Failed to refresh auto-route: {exc}")
 
             # Show styled welcome message (unless in dev mode)
-            if not _EXTENSION_HINT_SHOWN and not os.environ.get("CLEON_DEV_MODE"):
+            if not _STATE.extension_hint_shown and not os.environ.get("CLEON_DEV_MODE"):
                 _display_welcome_message()
-                _EXTENSION_HINT_SHOWN = True
+                _STATE.extension_hint_shown = True
 
-            # Check for updates (10% of the time, in background)
+            # Check for updates (cached; network only when opted in)
             _check_for_updates()
 
-            _AUTO_INITIALIZED = True
+            _STATE.auto_initialized = True
     except Exception:
         pass
 
 
+if os.environ.get("CLEON_EAGER_IMPORT"):
+    # Resolve every deferred export up front so CI catches broken lazy imports.
+    for _name in _LAZY_EXPORTS:
+        __getattr__(_name)
+
 _auto_register_magic()
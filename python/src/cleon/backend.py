@@ -2,26 +2,53 @@
 
 from __future__ import annotations
 
+import atexit
+import functools
 import json
 import os
 import queue
-import select
-import shutil
 import subprocess
 import sys
 import threading
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable, Iterable, Mapping, Protocol
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Mapping, Protocol
 
-import importlib.resources as importlib_resources
-
-from ._cleon import run as cleon_run  # type: ignore[import-not-found]
 from .settings import (
     get_agent_settings,
 )
 
+try:  # pragma: no cover - optional speedup when orjson is installed
+    import orjson
+
+    _json_loads: Callable[[bytes | str], Any] = orjson.loads
+    _ORJSON_AVAILABLE = True
+except ImportError:  # pragma: no cover - stdlib fallback
+    _json_loads = json.loads
+    _ORJSON_AVAILABLE = False
+
+
+def _encode_json_line(payload: Mapping[str, Any]) -> bytes:
+    """Serialize one JSON-lines record to UTF-8 bytes, newline included."""
+    if _ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(
+                payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+            )
+        except TypeError:
+            # Fall back for anything orjson refuses (e.g. int subclasses).
+            pass
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+# The CLI reads one prompt per line, so embedded newlines are folded into a
+# visible marker; CRLF collapses to a single marker.
+_PROMPT_TRANS = str.maketrans({"\n": " ⏎ ", "\r": ""})
+
+# Pipe reads are batched; one event stream chunk typically holds many lines.
+_READ_CHUNK = 65536
+
 
 class AgentBackend(Protocol):
     """Interface implemented by concrete agent backends."""
@@ -37,6 +64,7 @@ class AgentBackend(Protocol):
         *,
         on_event: Callable[[Any], None] | None = None,
         on_approval: Callable[[dict[str, Any]], str | None] | None = None,
+        collect_events: bool = True,
     ) -> tuple[Any, list[Any]]: ...
 
     def run_once(self, prompt: str) -> tuple[Any, list[Any]]: ...
@@ -54,7 +82,71 @@ class SessionStopInfo:
     resume_command: str | None
 
 
-_SESSION_LOCK = threading.Lock()
+class _LogWriter:
+    """Append-only log file kept open across writes.
+
+    The handle is reopened only when the target path changes. Writes are
+    buffered and flushed every ``flush_every`` records, when at least
+    ``flush_interval`` seconds have passed, or when the caller asks. With
+    ``flush_every=1`` the file is opened unbuffered, so each record is a
+    single O_APPEND write() with no intermediate buffer copy.
+    """
+
+    def __init__(self, *, flush_every: int, flush_interval: float = 0.5) -> None:
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._fh: BinaryIO | None = None
+        self._path: str | None = None
+        self._pending = 0
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def write(self, path: str, data: bytes, *, flush: bool = False) -> None:
+        with self._lock:
+            # Key on the absolute path so a relative default follows chdir()
+            # and different spellings of one file share a handle.
+            path = os.path.abspath(os.path.expanduser(path))
+            if self._fh is None or self._path != path:
+                self._close_locked()
+                target = Path(path)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                buffering = 0 if self.flush_every <= 1 else 1 << 16
+                self._fh = target.open("ab", buffering=buffering)
+                self._path = path
+                # The interval counts from when the handle was opened, not
+                # from an arbitrary monotonic epoch.
+                self._last_flush = time.monotonic()
+            self._fh.write(data)
+            self._pending += 1
+            now = time.monotonic()
+            if (
+                flush
+                or self._pending >= self.flush_every
+                or now - self._last_flush >= self.flush_interval
+            ):
+                self._fh.flush()
+                self._pending = 0
+                self._last_flush = now
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_locked()
+
+    def _close_locked(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+        self._fh = None
+        self._path = None
+        self._pending = 0
+
+
+# cleon.log: backend timing events and magic's streamed events go through this
+# one writer so records keep their order and share a single handle.
+_EVENT_LOG = _LogWriter(flush_every=64)
+atexit.register(_EVENT_LOG.close)
 
 
 def _log_backend_event(agent: str, event: str, details: Mapping[str, Any]) -> None:
@@ -68,11 +160,7 @@ def _log_backend_event(agent: str, event: str, details: Mapping[str, Any]) -> No
             "event": event,
             **dict(details),
         }
-        target = Path(path).expanduser()
-        target.parent.mkdir(parents=True, exist_ok=True)
-        with target.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(payload, ensure_ascii=False))
-            fh.write("\n")
+        _EVENT_LOG.write(path, _encode_json_line(payload))
     except Exception:
         # Logging must never break runtime behavior
         pass
@@ -81,6 +169,22 @@ def _log_backend_event(agent: str, event: str, details: Mapping[str, Any]) -> No
 class SharedSession:
     """Lightweight persistent CLI process for multi-turn Codex usage."""
 
+    __slots__ = (
+        "binary",
+        "env",
+        "proc",
+        "first_turn",
+        "session_id",
+        "rollout_path",
+        "resume_command",
+        "stopped",
+        "_lock",
+        "_child_env",
+        "_queue",
+        "_stdout_thread",
+        "_stderr_thread",
+    )
+
     def __init__(
         self,
         binary: str,
@@ -89,12 +193,22 @@ class SharedSession:
     ) -> None:
         self.binary = binary
         self.env = dict(env or {})
-        self.proc: subprocess.Popen[str] | None = None
+        self.proc: subprocess.Popen[bytes] | None = None
         self.first_turn: bool = True
         self.session_id: str | None = session_id
         self.rollout_path: str | None = None
         self.resume_command: str | None = None
         self.stopped: bool = False
+        # Serializes turns on this session's pipes; sessions never share state.
+        self._lock = threading.Lock()
+        # Child environment, built on first spawn and reused if the process
+        # has to be respawned; stop() drops it so a restart sees os.environ
+        # changes made in the meantime (e.g. API keys set in the notebook).
+        self._child_env: dict[str, str] | None = None
+        # Stdout lines pushed by the reader thread; ``None`` marks EOF.
+        self._queue: "queue.Queue[dict[str, Any] | None]" = queue.Queue()
+        self._stdout_thread: threading.Thread | None = None
+        self._stderr_thread: threading.Thread | None = None
 
     def ensure_started(self) -> None:
         if self.proc and self.proc.poll() is None:
@@ -102,35 +216,86 @@ class SharedSession:
         cmd = [self.binary, "--json-events", "--json-result"]
         if self.session_id:
             cmd.extend(["--resume", self.session_id])
+        if self._child_env is None:
+            self._child_env = {**os.environ, **self.env}
         self.proc = subprocess.Popen(
             cmd,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
-            env={**os.environ, **self.env},
-            bufsize=1,
+            env=self._child_env,
+        )
+        self._start_readers()
+
+    def _start_readers(self) -> None:
+        assert self.proc is not None
+        self._queue = queue.Queue()
+        self._stdout_thread = threading.Thread(
+            target=self._read_stdout, args=(self.proc, self._queue), daemon=True
         )
+        self._stdout_thread.start()
+        self._stderr_thread = threading.Thread(
+            target=self._read_stderr, args=(self.proc,), daemon=True
+        )
+        self._stderr_thread.start()
+
+    @staticmethod
+    def _read_stdout(
+        proc: subprocess.Popen[bytes], out_queue: "queue.Queue[dict[str, Any] | None]"
+    ) -> None:
+        # Events are decoded here, off the caller's thread, so send() and
+        # _drain_stdout() only ever see parsed JSON objects.
+        stdout = proc.stdout
+        try:
+            if stdout is not None:
+                for line in _iter_pipe_lines(stdout):
+                    # Events are JSON objects; skip log noise without decoding
+                    # it. Only strip when the line doesn't already start clean.
+                    if not line.startswith(b"{") and not line.lstrip().startswith(b"{"):
+                        continue
+                    try:
+                        event = _json_loads(line)
+                    except Exception:
+                        continue
+                    out_queue.put(event)
+        except Exception:
+            pass
+        finally:
+            out_queue.put(None)
+
+    @staticmethod
+    def _read_stderr(proc: subprocess.Popen[bytes]) -> None:
+        # Keep the stderr pipe drained so a chatty CLI can never block on it.
+        stderr = proc.stderr
+        if stderr is None:
+            return
+        try:
+            fd = stderr.fileno()
+            while os.read(fd, _READ_CHUNK):
+                continue
+        except Exception:
+            pass
 
     def stop(self) -> None:
         if self.proc and self.proc.poll() is None:
             try:
                 if self.proc.stdin:
                     try:
-                        self.proc.stdin.write("__CLEON_STOP__\n")
+                        self.proc.stdin.write(b"__CLEON_STOP__\n")
                         self.proc.stdin.flush()
                     except Exception:
                         pass
-                deadline = time.time() + 5.0
-                while time.time() < deadline:
-                    if self.proc.poll() is not None:
-                        break
-                    self._drain_stdout(capture_metadata=True)
-                    time.sleep(0.05)
-                self._drain_stdout(capture_metadata=True)
-                if self.proc.poll() is None:
+                # The reader thread keeps queueing events while we block here,
+                # so there is no need to poll; the session.resume metadata is
+                # picked up once the reader has seen EOF.
+                try:
+                    self.proc.wait(timeout=5.0)
+                except subprocess.TimeoutExpired:
                     self.proc.terminate()
-                    self._drain_stdout(capture_metadata=True)
+                    self.proc.wait(timeout=5.0)
+                if self._stdout_thread is not None:
+                    self._stdout_thread.join(timeout=1.0)
+                self._drain_stdout(capture_metadata=True)
             except Exception:
                 try:
                     self._drain_stdout(capture_metadata=True)
@@ -138,52 +303,59 @@ class SharedSession:
                     pass
                 self.proc.kill()
         self.proc = None
+        self._child_env = None
         self.first_turn = True
         self.stopped = True
 
-    def _read_lines(self) -> Iterable[str]:
-        assert self.proc is not None
-        if self.proc.stdout is None:
-            return
+    def _iter_events(self) -> Iterator[dict[str, Any]]:
         while True:
-            line = self.proc.stdout.readline()
-            if line == "":
+            event = self._queue.get()
+            if event is None:
+                # Leave the EOF marker in place for any later reader.
+                self._queue.put(None)
                 break
-            yield line.strip()
+            yield event
 
     def send(
         self,
         prompt: str,
         on_event: Callable[[Any], None] | None = None,
         on_approval: Callable[[dict[str, Any]], str | None] | None = None,
+        collect_events: bool = True,
     ) -> tuple[Any, list[Any]]:
-        with _SESSION_LOCK:
+        """Run one turn and return ``(result, events)``.
+
+        With ``collect_events=False`` the returned event list is empty, so a
+        long turn's events can be freed as soon as ``on_event`` has seen them.
+        """
+        with self._lock:
             self.ensure_started()
             assert self.proc is not None
             self._drain_stdout(capture_metadata=True)
             if self.proc.stdin is None:
                 raise RuntimeError("cleon session stdin unavailable")
-            single_line_prompt = prompt.replace("\n", " ⏎ ")
-            self.proc.stdin.write(single_line_prompt + "\n")
+            # Most prompts need no folding; skip the full-size copy for those.
+            if "\n" in prompt or "\r" in prompt:
+                prompt = prompt.translate(_PROMPT_TRANS)
+            # Two buffered writes instead of building prompt + "\n" first.
+            self.proc.stdin.write(prompt.encode("utf-8"))
+            self.proc.stdin.write(b"\n")
             self.proc.stdin.flush()
             self.first_turn = False
 
             events: list[Any] = []
             final: Any | None = None
-            for raw in self._read_lines():
-                try:
-                    parsed = json.loads(raw)
-                except Exception:
-                    continue
+            for parsed in self._iter_events():
                 self._capture_session_metadata(parsed)
-                events.append(parsed)
+                if collect_events:
+                    events.append(parsed)
                 if parsed.get("type") == "approval.request":
                     if on_approval is not None:
                         decision = on_approval(parsed)
                         if decision:
                             if self.proc.stdin is None:
                                 raise RuntimeError("cleon session stdin unavailable")
-                            self.proc.stdin.write(decision + "\n")
+                            self.proc.stdin.write((decision + "\n").encode("utf-8"))
                             self.proc.stdin.flush()
                             continue
                 if on_event is not None:
@@ -191,18 +363,11 @@ class SharedSession:
                         on_event(parsed)
                     except Exception:
                         pass
-                if (
-                    isinstance(parsed, dict)
-                    and parsed.get("type") == "turn.result"
-                    and "result" in parsed
-                ):
+                if parsed.get("type") == "turn.result" and "result" in parsed:
                     final = parsed["result"]
                     break
 
-            self._drain_stdout()
-            time.sleep(0.1)
-            self._drain_stdout()
-
+            # Trailing output stays queued and is drained before the next turn.
             if final is None:
                 raise RuntimeError("cleon output missing turn.result payload")
             return final, events
@@ -212,77 +377,42 @@ class SharedSession:
         self.first_turn = True
 
     def _drain_stdout(self, capture_metadata: bool = False) -> None:
-        assert self.proc is not None
-        stdout = self.proc.stdout
-        if stdout is None:
-            return
-
-        def _maybe_parse(line: str) -> None:
-            if not capture_metadata:
-                return
-            try:
-                parsed = json.loads(line)
-                self._capture_session_metadata(parsed)
-            except Exception:
-                pass
-
-        try:
-            fd = stdout.fileno()
-        except Exception:
+        """Consume already-decoded stdout events without blocking."""
+        while True:
             try:
-                if hasattr(stdout, "seekable") and stdout.seekable():
-                    for _ in range(50):
-                        line = stdout.readline()
-                        if not line:
-                            break
-                        _maybe_parse(line)
-            except Exception:
-                pass
-            return
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if event is None:
+                self._queue.put(None)
+                return
+            if capture_metadata:
+                self._capture_session_metadata(event)
 
-        for _ in range(50):
-            ready, _, _ = select.select([fd], [], [], 0)
-            if not ready:
-                break
-            line = stdout.readline()
-            if not line:
-                break
-            _maybe_parse(line)
+    # Attributes overwritten by ``session.resume`` events.
+    _RESUME_KEYS = ("session_id", "resume_command", "rollout_path")
+    # Attributes filled from the first event (or its ``msg``) that carries them.
+    _META_KEYS = ("session_id", "rollout_path")
 
     def _capture_session_metadata(self, payload: Any) -> None:
-        try:
-            if isinstance(payload, dict):
-                if payload.get("type") == "session.resume":
-                    if isinstance(payload.get("session_id"), str):
-                        self.session_id = payload["session_id"]
-                    if isinstance(payload.get("resume_command"), str):
-                        self.resume_command = payload["resume_command"]
-                    if isinstance(payload.get("rollout_path"), str):
-                        self.rollout_path = payload["rollout_path"]
-                if self.session_id is None:
-                    if "session_id" in payload and isinstance(
-                        payload["session_id"], str
-                    ):
-                        self.session_id = payload["session_id"]
-                    elif (
-                        "msg" in payload
-                        and isinstance(payload["msg"], dict)
-                        and isinstance(payload["msg"].get("session_id"), str)
-                    ):
-                        self.session_id = payload["msg"]["session_id"]
-                if self.rollout_path is None:
-                    if "rollout_path" in payload and isinstance(
-                        payload["rollout_path"], str
-                    ):
-                        self.rollout_path = payload["rollout_path"]
-                    elif (
-                        "msg" in payload
-                        and isinstance(payload["msg"], dict)
-                        and isinstance(payload["msg"].get("rollout_path"), str)
-                    ):
-                        self.rollout_path = payload["msg"]["rollout_path"]
-        except Exception:
-            pass
+        if not isinstance(payload, dict):
+            return
+        if payload.get("type") == "session.resume":
+            for key in self._RESUME_KEYS:
+                value = payload.get(key)
+                if isinstance(value, str):
+                    setattr(self, key, value)
+        if self.session_id is not None and self.rollout_path is not None:
+            return
+        msg = payload.get("msg")
+        for key in self._META_KEYS:
+            if getattr(self, key) is not None:
+                continue
+            value = payload.get(key)
+            if not isinstance(value, str) and isinstance(msg, dict):
+                value = msg.get(key)
+            if isinstance(value, str):
+                setattr(self, key, value)
 
 
 class CodexBackend:
@@ -342,11 +472,19 @@ class CodexBackend:
         *,
         on_event: Callable[[Any], None] | None = None,
         on_approval: Callable[[dict[str, Any]], str | None] | None = None,
+        collect_events: bool = True,
     ) -> tuple[Any, list[Any]]:
         session = self._ensure_session()
-        return session.send(prompt, on_event=on_event, on_approval=on_approval)
+        return session.send(
+            prompt,
+            on_event=on_event,
+            on_approval=on_approval,
+            collect_events=collect_events,
+        )
 
     def run_once(self, prompt: str) -> tuple[Any, list[Any]]:
+        from ._cleon import run as cleon_run  # type: ignore[import-not-found]
+
         return cleon_run(prompt)
 
     def stop(self) -> SessionStopInfo:
@@ -368,51 +506,109 @@ class CodexBackend:
         return proc is not None and proc.poll() is None
 
 
+def _iter_pipe_lines(stream: Any) -> Iterator[bytes]:
+    """Yield lines from a binary pipe, reading in large batches.
+
+    Lines from a real pipe are not stripped: JSON parsers skip surrounding
+    whitespace, so copying every event just to trim it is wasted work.
+    """
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        # In-memory streams (tests) have no fd; fall back to line iteration.
+        for line in stream:
+            if isinstance(line, str):
+                line = line.encode("utf-8")
+            yield line.strip()
+        return
+    # Pull whatever the pipe holds in one syscall and split it here rather
+    # than scanning byte-by-byte with readline(). Chunks of an unfinished
+    # line are collected and joined once, so a multi-megabyte turn.result
+    # isn't re-copied on every read.
+    partial: list[bytes] = []
+    while True:
+        chunk = os.read(fd, _READ_CHUNK)
+        if not chunk:
+            break
+        if b"\n" not in chunk:
+            partial.append(chunk)
+            continue
+        if partial:
+            partial.append(chunk)
+            chunk = b"".join(partial)
+            partial = []
+        *lines, tail = chunk.split(b"\n")
+        yield from lines
+        if tail:
+            partial.append(tail)
+    if partial:
+        yield b"".join(partial)
+
+
+_CLEON_BINARY_CACHE: dict[tuple[str | None, str | None], str] = {}
+
+
 def _resolve_cleon_binary(explicit: str | None) -> str | None:
-    candidates: list[str] = []
-    if explicit:
-        candidates.append(explicit)
+    key = (explicit, os.environ.get("CLEON_BIN"))
+    cached = _CLEON_BINARY_CACHE.get(key)
+    if cached is not None and os.path.isfile(cached):
+        return cached
+    resolved = next(
+        (
+            str(Path(norm))
+            for norm in map(os.path.expanduser, _cleon_binary_candidates(*key))
+            if os.path.isfile(norm)
+        ),
+        None,
+    )
+    if resolved is not None:
+        _CLEON_BINARY_CACHE[key] = resolved
+    return resolved
+
 
-    env_value = os.environ.get("CLEON_BIN")
+def _cleon_binary_candidates(
+    explicit: str | None, env_value: str | None
+) -> Iterator[str]:
+    """Yield candidate paths in priority order; later probes only run on a miss."""
+
+    import importlib.resources as importlib_resources
+    import shutil
+
+    if explicit:
+        yield explicit
     if env_value:
-        candidates.append(env_value)
+        yield env_value
 
     try:
         pkg_bin = importlib_resources.files(__package__).joinpath("bin")
         for name in ("cleon.exe", "cleon"):
-            cand = pkg_bin / name
-            if cand.is_file():
-                candidates.append(str(cand))
+            yield str(pkg_bin / name)
     except Exception:
         pass
 
     which_value = shutil.which("cleon")
     if which_value:
-        candidates.append(which_value)
+        yield which_value
 
-    for parent in Path(__file__).resolve().parents:
-        target_dir = parent / "target"
-        if not target_dir.exists():
-            continue
-        for profile in ("release", "debug"):
-            candidate_path = target_dir / profile / "cleon"
-            if candidate_path.is_file():
-                candidates.append(str(candidate_path))
-
-    seen: set[str] = set()
-    for candidate in candidates:
-        norm = os.path.expanduser(candidate)
-        if norm in seen:
-            continue
-        seen.add(norm)
-        path = Path(norm)
-        if path.is_file():
-            return str(path)
+    # Only source checkouts have a cargo target/ dir next to the package; the
+    # dev scripts (cleon.sh, jupyter.sh) export CLEON_DEV_MODE.
+    if os.environ.get("CLEON_DEV_MODE"):
+        yield from _dev_target_candidates()
 
-    return None
+
+@functools.lru_cache(maxsize=1)
+def _dev_target_candidates() -> tuple[str, ...]:
+    """Cargo output paths above this file; computed once per process."""
+    return tuple(
+        str(parent / "target" / profile / "cleon")
+        for parent in Path(__file__).resolve().parents
+        for profile in ("release", "debug")
+    )
 
 
 def _resolve_pi_command(config: Any) -> list[str]:
+    import shutil
+
     if isinstance(config, str):
         return [config]
     if isinstance(config, Iterable):
@@ -428,6 +624,8 @@ def _resolve_pi_command(config: Any) -> list[str]:
 def _resolve_gemini_command(config: Any, explicit: str | None) -> list[str]:
     """Resolve how to launch the gemini CLI."""
 
+    import shutil
+
     if explicit:
         return [explicit]
     if isinstance(config, str):
@@ -453,6 +651,8 @@ def _resolve_gemini_command(config: Any, explicit: str | None) -> list[str]:
 
 
 def _packaged_gemini_bundle() -> str | None:
+    import importlib.resources as importlib_resources
+
     try:
         candidate = importlib_resources.files(__package__).joinpath("bin/gemini.js")
         if candidate.is_file():
@@ -479,7 +679,7 @@ class PiProcess:
         self._cwd = Path(settings.get("cwd") or os.getcwd())
         self._timeout = float(settings.get("response_timeout") or 240.0)
         self._queue: "queue.Queue[dict[str, Any]]" = queue.Queue()
-        self._proc: subprocess.Popen[str] | None = None
+        self._proc: subprocess.Popen[bytes] | None = None
         self._stdout_thread: threading.Thread | None = None
         self._stderr_thread: threading.Thread | None = None
         self._last_stderr: list[str] = []
@@ -522,8 +722,10 @@ class PiProcess:
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
+                # Binary pipes: stdout is read from the raw fd by
+                # _iter_pipe_lines, so no text wrapper may buffer ahead of it.
+                # Block-buffered; _send() flushes each request explicitly.
+                bufsize=_READ_CHUNK,
             )
         except FileNotFoundError as exc:
             raise RuntimeError(
@@ -540,14 +742,17 @@ class PiProcess:
         if not proc or not proc.stdout:
             return
         try:
-            for line in proc.stdout:
+            # Read the raw fd in batches; orjson parses the bytes directly.
+            for line in _iter_pipe_lines(proc.stdout):
                 if not line:
                     continue
                 try:
-                    parsed = json.loads(line.strip())
+                    parsed = _json_loads(line)
                 except Exception:
                     continue
                 self._queue.put(parsed)
+        except Exception:
+            pass
         finally:
             self._queue.put({"type": "pi.process_exit"})
 
@@ -559,7 +764,9 @@ class PiProcess:
             self._last_stderr = []
             for line in proc.stderr:
                 if line:
-                    self._last_stderr.append(line.rstrip())
+                    self._last_stderr.append(
+                        line.decode("utf-8", errors="replace").rstrip()
+                    )
                     if len(self._last_stderr) > 50:
                         self._last_stderr = self._last_stderr[-50:]
         finally:
@@ -591,7 +798,7 @@ class PiProcess:
         if not proc or proc.stdin is None:
             raise RuntimeError("pi backend is not running.")
         try:
-            proc.stdin.write(json.dumps(payload) + "\n")
+            proc.stdin.write(_encode_json_line(payload))
             proc.stdin.flush()
         except BrokenPipeError as exc:
             raise RuntimeError(
@@ -605,6 +812,7 @@ class PiProcess:
         self,
         prompt: str,
         on_event: Callable[[Any], None] | None = None,
+        collect_events: bool = True,
     ) -> tuple[dict[str, Any], list[dict[str, Any]]]:
         self._send({"type": "prompt", "message": prompt})
         events: list[dict[str, Any]] = []
@@ -639,7 +847,8 @@ class PiProcess:
             if raw.get("type") == "error":
                 raise RuntimeError(raw.get("error") or "pi backend reported an error.")
             translated = _translate_pi_event(raw)
-            events.append(translated)
+            if collect_events:
+                events.append(translated)
             if on_event:
                 try:
                     on_event(translated)
@@ -680,13 +889,16 @@ class PiBackend:
         *,
         on_event: Callable[[Any], None] | None = None,
         on_approval: Callable[[dict[str, Any]], str | None] | None = None,
+        collect_events: bool = True,
     ) -> tuple[Any, list[Any]]:
         del on_approval
         with self._send_lock:
             retry_once = True
             while True:
                 try:
-                    return self._process.send_prompt(prompt, on_event=on_event)
+                    return self._process.send_prompt(
+                        prompt, on_event=on_event, collect_events=collect_events
+                    )
                 except RuntimeError as exc:
                     msg = str(exc).lower()
                     transient = (
@@ -747,7 +959,7 @@ class GeminiProcess:
         self._cmd = _resolve_gemini_command(settings.get("command"), explicit_binary)
         self._timeout = float(settings.get("response_timeout") or 240.0)
         self._log_prefix = "[gemini]"
-        self._proc: subprocess.Popen[str] | None = None
+        self._proc: subprocess.Popen[bytes] | None = None
         self._queue: "queue.Queue[dict[str, Any]]" = queue.Queue()
         self._stdout_thread: threading.Thread | None = None
         self._stderr_thread: threading.Thread | None = None
@@ -802,8 +1014,10 @@ class GeminiProcess:
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
+                # Binary pipes: stdout is read from the raw fd by
+                # _iter_pipe_lines, so no text wrapper may buffer ahead of it.
+                # Block-buffered; _send() flushes each request explicitly.
+                bufsize=_READ_CHUNK,
             )
             _log_backend_event(
                 "gemini",
@@ -833,14 +1047,17 @@ class GeminiProcess:
         if not proc or not proc.stdout:
             return
         try:
-            for line in proc.stdout:
+            # Read the raw fd in batches; orjson parses the bytes directly.
+            for line in _iter_pipe_lines(proc.stdout):
                 if not line:
                     continue
                 try:
-                    parsed = json.loads(line.strip())
+                    parsed = _json_loads(line)
                 except Exception:
                     continue
                 self._queue.put(parsed)
+        except Exception:
+            pass
         finally:
             self._queue.put({"type": "gemini.process_exit"})
 
@@ -884,7 +1101,7 @@ class GeminiProcess:
         if not proc or proc.stdin is None:
             raise RuntimeError("Gemini backend is not running.")
         try:
-            proc.stdin.write(json.dumps(payload) + "\n")
+            proc.stdin.write(_encode_json_line(payload))
             proc.stdin.flush()
         except Exception as exc:
             raise RuntimeError(
@@ -895,6 +1112,7 @@ class GeminiProcess:
         self,
         prompt: str,
         on_event: Callable[[Any], None] | None = None,
+        collect_events: bool = True,
     ) -> tuple[dict[str, Any], list[dict[str, Any]]]:
         start_ts = time.time()
         _log_backend_event(
@@ -904,6 +1122,7 @@ class GeminiProcess:
         )
         self._send({"type": "prompt", "message": prompt})
         events: list[dict[str, Any]] = []
+        event_count = 0
         final_parts: list[str] = []
         first_event_ts: float | None = None
         last_raw: Mapping[str, Any] | None = None
@@ -931,7 +1150,9 @@ class GeminiProcess:
                 raise RuntimeError("Gemini backend exited unexpectedly.")
 
             translated = _translate_gemini_event(raw)
-            events.append(translated)
+            event_count += 1
+            if collect_events:
+                events.append(translated)
             if first_event_ts is None:
                 first_event_ts = time.time()
             last_raw = raw
@@ -958,7 +1179,7 @@ class GeminiProcess:
             "send.complete",
             {
                 "prompt_chars": len(prompt),
-                "events": len(events),
+                "events": event_count,
                 "first_event_ms": int((first_event_ts - start_ts) * 1000)
                 if first_event_ts
                 else None,
@@ -1009,6 +1230,7 @@ class GeminiBackend:
         *,
         on_event: Callable[[Any], None] | None = None,
         on_approval: Callable[[dict[str, Any]], str | None] | None = None,
+        collect_events: bool = True,
     ) -> tuple[Any, list[Any]]:
         del on_approval
         with self._send_lock:
@@ -1016,7 +1238,7 @@ class GeminiBackend:
             while True:
                 try:
                     result, events = self._process.send_prompt(
-                        prompt, on_event=on_event
+                        prompt, on_event=on_event, collect_events=collect_events
                     )
                     self._first_turn = False
                     return result, events
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import atexit
 import base64
 import html
 import importlib.resources as importlib_resources
@@ -10,10 +11,13 @@ import json
 import os
 import queue
 import re
+import reprlib
+import sys
 import threading
 import time
 import traceback
 import uuid
+import weakref
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Callable, Iterable, Mapping
@@ -41,6 +45,16 @@ except Exception:  # pragma: no cover - fallback when IPython is missing
             self.data = data
 
 
+# Imported on its own so a partial IPython.display (e.g. a test double) can't
+# knock out get_ipython/display above; only the widget prompts use it.
+try:  # pragma: no cover - optional import when IPython is available
+    from IPython.display import clear_output  # type: ignore
+except Exception:  # pragma: no cover - fallback when IPython is missing
+
+    def clear_output(*_: object, **__: object) -> None:  # type: ignore
+        pass
+
+
 from collections import deque
 
 try:
@@ -52,7 +66,13 @@ try:
 except ImportError:
     _PYGMENTS_AVAILABLE = False
 
-from .backend import AgentBackend, resolve_backend
+from .backend import (
+    _EVENT_LOG,
+    AgentBackend,
+    _encode_json_line,
+    _LogWriter,
+    resolve_backend,
+)
 from .settings import (
     get_agent_prefix,
     get_agent_theme,
@@ -65,6 +85,7 @@ from .settings import (
     reset_settings as settings_reset,
     plain_text_output,
     load_settings,
+    read_prompt_file,
 )
 
 
@@ -325,6 +346,9 @@ def _mark_async_done() -> None:
 def _wait_for_async_tasks() -> None:
     if not _ASYNC_MODE:
         return
+    # Back off while waiting: queued agent turns usually take seconds, so a
+    # fixed 50ms poll mostly wakes the kernel for nothing.
+    delay = 0.02
     while True:
         all_empty = (
             all(q.empty() for q in _AGENT_QUEUES.values()) if _AGENT_QUEUES else True
@@ -334,7 +358,8 @@ def _wait_for_async_tasks() -> None:
         if all_empty and active == 0:
             _ASYNC_IDLE.set()
             return
-        time.sleep(0.05)
+        time.sleep(delay)
+        delay = min(delay * 1.5, 0.5)
 
 
 def _active_async_requests() -> int:
@@ -349,7 +374,9 @@ def _worker_loop(agent_name: str) -> None:
             agent_queue = _AGENT_QUEUES.get(agent_name)
             if agent_queue is None or _CANCEL_ALL.is_set():
                 break
-            request = agent_queue.get(timeout=0.5)
+            # Block until work arrives; _stop_worker_thread() wakes us with a
+            # poison pill, so there is no need to poll while idle.
+            request = agent_queue.get()
             if request is None:  # Poison pill to stop worker
                 break
             with _CANCELLED_LOCK:
@@ -379,8 +406,6 @@ def _worker_loop(agent_name: str) -> None:
                 _mark_async_done()
                 with _CANCELLED_LOCK:
                     _PENDING_REQUESTS.pop(request.request_id, None)
-        except queue.Empty:
-            continue
         except Exception:
             # Log error but keep worker running
             pass
@@ -500,9 +525,8 @@ def _reset_cancellations(agent_name: str = "codex") -> None:
 
 
 def _session_store_path() -> Path:
-    path = get_session_store_path()
-    path.parent.mkdir(parents=True, exist_ok=True)
-    return path
+    # get_session_store_path() lives in ~/.cleon, which get_cleon_home() creates.
+    return get_session_store_path()
 
 
 def _load_session_store() -> dict[str, dict[str, str]]:
@@ -551,18 +575,37 @@ def _persist_session_id(session_id: str, resume_cmd: str | None, agent: str) ->
         pass
 
 
+_WIDGETS_UNPROBED = object()
+_WIDGETS_MODULE: Any = _WIDGETS_UNPROBED
+
+
+def _load_widgets() -> Any:
+    """Return ``ipywidgets`` or None; the import is attempted only once.
+
+    Failed imports are not cached by Python, so probing on every async
+    submission would rescan sys.path each time ipywidgets is missing.
+    """
+    global _WIDGETS_MODULE
+    if _WIDGETS_MODULE is _WIDGETS_UNPROBED:
+        try:
+            import ipywidgets  # type: ignore
+
+            _WIDGETS_MODULE = ipywidgets
+        except Exception:
+            _WIDGETS_MODULE = None
+    return _WIDGETS_MODULE
+
+
 def _render_async_status(
     display_id: str, request_id: str, status: str, *, cancellable: bool
 ) -> None:
-    try:
-        import ipywidgets as widgets  # type: ignore
-    except Exception:
-        display(
-            HTML(f'<div style="color: #888;">{status}</div>'), display_id=display_id
-        )
+    status_markup = f'<div style="color: #888;">{status}</div>'
+    widgets = _load_widgets()
+    if widgets is None:
+        display(HTML(status_markup), display_id=display_id)
         return
 
-    status_html = widgets.HTML(f'<div style="color: #888;">{status}</div>')
+    status_html = widgets.HTML(status_markup)
     if cancellable:
         btn = widgets.Button(
             description="Cancel",
@@ -581,6 +624,54 @@ def _render_async_status(
         display(status_html, display_id=display_id)
 
 
+def _build_full_prompt(
+    backend: AgentBackend,
+    agent_name: str,
+    prompt: str,
+    *,
+    include_context: bool,
+    context_cells: int | None,
+    context_chars: int | None,
+) -> str:
+    """Assemble template -> context -> inter-agent history -> user prompt."""
+
+    # Sections are separated by blank lines. Headers and bodies are kept as
+    # separate pieces so a large context block is copied once, by the join.
+    pieces: list[str] = []
+
+    def _add_section(*chunks: str) -> None:
+        if pieces:
+            pieces.append("\n\n")
+        pieces.extend(chunks)
+
+    # 1. Template (first turn only)
+    if backend.first_turn():
+        template = _resolve_template(agent_name)
+        if template:
+            _log_template(template)
+            _add_section(template)
+
+    # 2. Context (if enabled)
+    if include_context:
+        context_block = _build_context_block(context_cells, context_chars, agent_name)
+        if context_block:
+            if _debug_enabled():
+                _log_context_block(context_block)
+            _add_section("Context (changed cells):\n", context_block)
+
+    history_block = _build_interagent_context(agent_name)
+    if history_block:
+        _add_section(history_block)
+
+    # 3. User prompt
+    if pieces:
+        _add_section("User prompt:\n", prompt)
+        prompt = "".join(pieces)
+
+    _log_prompt(prompt)
+    return prompt
+
+
 def _process_codex_request(request: CodexRequest) -> None:
     """Process a single codex request and update display."""
 
@@ -607,43 +698,21 @@ def _process_codex_request(request: CodexRequest) -> None:
                 _CANCELLED_REQUESTS.discard(request.request_id)
                 _PENDING_REQUESTS.pop(request.request_id, None)
                 return
-        # Build full prompt with template/context
-        parts = []
-
-        # 1. Template (first turn only)
-        if backend.first_turn():
-            template = _resolve_template(agent_name)
-            if template:
-                _log_template(template)
-                parts.append(template)
-
-        # 2. Context (if enabled)
-        if _CONTEXT_TRACKER is not None:
-            context_block = _build_context_block(
-                request.context_cells, request.context_chars, agent_name
-            )
-            if context_block:
-                _log_context_block(context_block)
-                parts.append(f"Context (changed cells):\n{context_block}")
-
-        history_block = _build_interagent_context(agent_name)
-        if history_block:
-            parts.append(history_block)
-
-        # 3. User prompt
-        if parts:
-            parts.append(f"User prompt:\n{request.prompt}")
-            full_prompt = "\n\n".join(parts)
-        else:
-            full_prompt = request.prompt
-
-        _log_prompt(full_prompt)
+        full_prompt = _build_full_prompt(
+            backend,
+            agent_name,
+            request.prompt,
+            include_context=_CONTEXT_TRACKER is not None,
+            context_cells=request.context_cells,
+            context_chars=request.context_chars,
+        )
 
         # Send to backend
         result, events = backend.send(
             full_prompt,
-            on_event=_chain(progress.update, _log_event),
+            on_event=_chain(progress.on_event, _log_event),
             on_approval=_prompt_approval,
+            collect_events=request.emit_events,
         )
 
         # Extract response and log
@@ -733,6 +802,99 @@ def register_magic(
 
     emit_events = show_events
 
+    def _command_progress(active_backend: AgentBackend) -> _Progress:
+        def _cancel() -> None:
+            _stop_session(
+                agent=normalized,
+                backend=active_backend,
+                force=True,
+                wait_for_tasks=False,
+            )
+
+        return _Progress(render=stream, _cancel=_cancel)
+
+    # One-shot prompt (fresh process)
+    def _cmd_fresh(rest: str, active_backend: AgentBackend) -> Any:
+        if not rest:
+            print("Usage: /fresh <prompt>")
+            return None
+        progress = _command_progress(active_backend)
+        result, events = active_backend.run_once(rest)
+        _log_events(events)
+        if mode != "none":
+            _display_result(
+                result, mode, progress, getattr(active_backend, "name", "codex")
+            )
+        if emit_events:
+            _print_events(events)
+        return result if emit_events else None
+
+    def _cmd_stop(rest: str, active_backend: AgentBackend) -> Any:
+        stop(agent=normalized)
+        if async_mode:
+            print("cleon session and async worker stopped.")
+        else:
+            print("cleon session stopped.")
+        return None
+
+    def _cmd_status(rest: str, active_backend: AgentBackend) -> Any:
+        alive = _session_alive()
+        print(f"cleon session: {'running' if alive else 'stopped'}")
+        return alive
+
+    def _cmd_new(rest: str, active_backend: AgentBackend) -> Any:
+        _stop_session(
+            agent=normalized,
+            backend=active_backend,
+            keep_backend=True,
+            force=True,
+            wait_for_tasks=False,
+        )
+        active_backend = _require_backend(normalized)
+        progress = _command_progress(active_backend)
+        result, events = active_backend.send(
+            rest,
+            on_event=_chain(progress.on_event, _log_event),
+            on_approval=_prompt_approval,
+            collect_events=emit_events,
+        )
+        if mode != "none":
+            _display_result(
+                result, mode, progress, getattr(active_backend, "name", "codex")
+            )
+        if emit_events:
+            _print_events(events)
+        return result if emit_events else None
+
+    def _cmd_peek_history(rest: str, active_backend: AgentBackend) -> Any:
+        if not context_changes:
+            print(
+                "Context tracking not enabled. Use cleon.use(..., context_changes=True)"
+            )
+            return None
+        block = _build_context_block(
+            context_cells,
+            context_chars,
+            getattr(active_backend, "name", "codex"),
+            peek=True,
+        )
+        if block:
+            print("Preview of context for next %%codex turn:\n")
+            print(block)
+        else:
+            print("No changed cells detected.")
+        return block
+
+    # Command prefixes for mode control, resolved with one dict lookup.
+    slash_commands: dict[str, Callable[[str, AgentBackend], Any]] = {
+        "/fresh": _cmd_fresh,
+        "/once": _cmd_fresh,
+        "/stop": _cmd_stop,
+        "/status": _cmd_status,
+        "/new": _cmd_new,
+        "/peek_history": _cmd_peek_history,
+    }
+
     def _codex_magic(line: str, cell: str | None = None) -> Any:
         prompt = _normalize_payload(line, cell)
         if not prompt:
@@ -743,88 +905,15 @@ def register_magic(
         active_backend = _require_backend(normalized)
         active_agent_name = getattr(active_backend, "name", "codex")
 
-        # Command prefixes for mode control
         if prompt.startswith("/"):
             cmd, _, rest = prompt.partition(" ")
             cmd = cmd.lower()
-
-            def _cancel() -> None:
-                _stop_session(
-                    agent=normalized,
-                    backend=active_backend,
-                    force=True,
-                    wait_for_tasks=False,
-                )
-
-            progress = _Progress(render=stream, _cancel=_cancel)
-
-            # One-shot prompt (fresh process)
-            if cmd in {"/fresh", "/once"}:
-                payload = rest.strip()
-                if not payload:
-                    print("Usage: /fresh <prompt>")
-                    return None
-                result, events = active_backend.run_once(payload)
-                _log_events(events)
-                if mode != "none":
-                    _display_result(result, mode, progress, active_agent_name)
-                if emit_events:
-                    _print_events(events)
-                return result if emit_events else None
-
-            if cmd == "/stop":
-                stop(agent=normalized)
-                if async_mode:
-                    print("cleon session and async worker stopped.")
-                else:
-                    print("cleon session stopped.")
+            handler = slash_commands.get(cmd)
+            if handler is None:
+                print(f"Unknown command: {cmd}")
+                print("Commands: /fresh, /stop, /status, /new, /peek_history")
                 return None
-
-            if cmd == "/status":
-                alive = _session_alive()
-                print(f"cleon session: {'running' if alive else 'stopped'}")
-                return alive
-
-            if cmd == "/new":
-                _stop_session(
-                    agent=normalized,
-                    backend=active_backend,
-                    keep_backend=True,
-                    force=True,
-                    wait_for_tasks=False,
-                )
-                active_backend = _require_backend(normalized)
-                active_agent_name = getattr(active_backend, "name", "codex")
-                result, events = active_backend.send(
-                    rest.strip(),
-                    on_event=_chain(progress.update, _log_event),
-                    on_approval=_prompt_approval,
-                )
-                if mode != "none":
-                    _display_result(result, mode, progress, active_agent_name)
-                if emit_events:
-                    _print_events(events)
-                return result if emit_events else None
-
-            if cmd == "/peek_history":
-                if not context_changes:
-                    print(
-                        "Context tracking not enabled. Use cleon.use(..., context_changes=True)"
-                    )
-                    return None
-                block = _build_context_block(
-                    context_cells, context_chars, active_agent_name, peek=True
-                )
-                if block:
-                    print("Preview of context for next %%codex turn:\n")
-                    print(block)
-                else:
-                    print("No changed cells detected.")
-                return block
-
-            print(f"Unknown command: {cmd}")
-            print("Commands: /fresh, /stop, /status, /new, /peek_history")
-            return None
+            return handler(rest.strip(), active_backend)
 
         # Async mode: queue request and return immediately
         if async_mode:
@@ -874,43 +963,23 @@ def register_magic(
 
         progress = _Progress(render=stream, _cancel=_cancel_sync)
 
-        # Build prompt with proper order: template -> context -> user prompt
         session_backend = active_backend
         agent_name = getattr(session_backend, "name", "codex")
-        parts = []
-
-        # 1. Template (first turn only)
-        if session_backend.first_turn():
-            template = _resolve_template(agent_name)
-            if template:
-                _log_template(template)
-                parts.append(template)
-
-        # 2. Context (if enabled)
-        if context_changes:
-            context_block = _build_context_block(
-                context_cells, context_chars, agent_name
-            )
-            if context_block:
-                _log_context_block(context_block)
-                parts.append(f"Context (changed cells):\n{context_block}")
-
-        interagent_context = _build_interagent_context(active_agent_name)
-        if interagent_context:
-            parts.append(interagent_context)
-
-        # 3. User prompt
-        if parts:
-            parts.append(f"User prompt:\n{prompt}")
-            prompt = "\n\n".join(parts)
-
-        _log_prompt(prompt)
+        prompt = _build_full_prompt(
+            session_backend,
+            agent_name,
+            prompt,
+            include_context=context_changes,
+            context_cells=context_cells,
+            context_chars=context_chars,
+        )
 
         try:
             result, events = session_backend.send(
                 prompt,
-                on_event=_chain(progress.update, _log_event),
+                on_event=_chain(progress.on_event, _log_event),
                 on_approval=_prompt_approval,
+                collect_events=emit_events,
             )
             if isinstance(result, dict) and not result.get("final_message"):
                 result["final_message"] = "(no output received)"
@@ -1346,20 +1415,52 @@ def _line_has_agent_prefix(line: str, prefixes: dict) -> tuple[str, str, str] |
         @codex query    -> ("@codex", "@", "codex")
         ~claude query   -> ("~claude", "~", "claude")
     """
-    stripped = line.lstrip()
-    for prefix, (agent_name, magic_name) in prefixes.items():
+    pattern, results = _prefix_matcher(prefixes)
+    if pattern is None:
+        return None
+    m = pattern.match(line.lstrip())
+    if m is None:
+        return None
+    return results[m.lastindex - 1]  # type: ignore[operator]
+
+
+# Compiled matchers keyed by the rule items they were built from; the rules
+# dict is refilled in place on reconfiguration, so its id() can't be the key.
+_PREFIX_MATCHERS: dict[
+    tuple[Any, ...], tuple[re.Pattern[str] | None, list[tuple[str, str, str]]]
+] = {}
+
+
+def _prefix_matcher(
+    prefixes: dict,
+) -> tuple[re.Pattern[str] | None, list[tuple[str, str, str]]]:
+    """Return one alternation regex covering every prefix form, plus the
+    result tuple for each of its groups.
+
+    Alternatives keep the old check order (rule order; bare prefix, then
+    "# " prefix; plain prefix before prefix+agent), and regex alternation
+    takes the first one that matches, so results are unchanged.
+    """
+    key = tuple(prefixes.items())
+    cached = _PREFIX_MATCHERS.get(key)
+    if cached is not None:
+        return cached
+    alternatives: list[str] = []
+    results: list[tuple[str, str, str]] = []
+    for prefix, (agent_name, magic_name) in key:
         candidates = [prefix]
         if agent_name:
             candidates.append(f"{prefix}{agent_name}")
-
         for cand in candidates:
-            if stripped.startswith(cand):
-                return cand, prefix, magic_name
             # Commented prefix match: "# @" or "# @codex" etc
-            commented_prefix = f"# {cand}"
-            if stripped.startswith(commented_prefix):
-                return commented_prefix, prefix, magic_name
-    return None
+            for form in (cand, f"# {cand}"):
+                alternatives.append(f"({re.escape(form)})")
+                results.append((form, prefix, magic_name))
+    pattern = re.compile("|".join(alternatives)) if alternatives else None
+    if len(_PREFIX_MATCHERS) >= 8:
+        _PREFIX_MATCHERS.clear()
+    _PREFIX_MATCHERS[key] = (pattern, results)
+    return pattern, results
 
 
 def _detect_mixed_cell(raw_cell: str) -> tuple[str, str, str, str] | None:
@@ -1390,9 +1491,19 @@ def _detect_mixed_cell(raw_cell: str) -> tuple[str, str, str, str] | None:
     matched_prefix = None
     actual_prefix = None
     matched_magic = None
+    # Whether any earlier line is non-empty and not itself an agent query;
+    # tracked as we go rather than rescanning lines[:i] on every match.
+    code_seen = False
 
     for i, line in enumerate(lines):
         stripped_line = line.strip()
+        has_code_before = code_seen
+        if (
+            not code_seen
+            and stripped_line
+            and _line_has_agent_prefix(line, _AUTO_ROUTE_RULES) is None
+        ):
+            code_seen = True
 
         # Toggle triple-quoted string context
         quote_hits = stripped_line.count('"""') + stripped_line.count("'''")
@@ -1413,10 +1524,6 @@ def _detect_mixed_cell(raw_cell: str) -> tuple[str, str, str, str] | None:
         if match:
             m_prefix, a_prefix, magic_name = match
             # Make sure this isn't the first non-empty line (that's a pure agent query)
-            has_code_before = any(
-                ln.strip() and _line_has_agent_prefix(ln, _AUTO_ROUTE_RULES) is None
-                for ln in lines[:i]
-            )
             if has_code_before:
                 split_idx = i
                 matched_prefix = m_prefix
@@ -1544,41 +1651,41 @@ def _display_result(
 
 
 def _extract_final_message(result: Any) -> str:
-    if isinstance(result, Mapping):
-        final = result.get("final_message")  # type: ignore[arg-type]
-        if isinstance(final, str) and final.strip():
-            return final
-        summary = result.get("summary")  # type: ignore[arg-type]
-        if isinstance(summary, str) and summary.strip():
-            return summary
-        # Provide a concise fallback instead of dumping the whole mapping
-        errors = result.get("errors")  # type: ignore[arg-type]
-        if isinstance(errors, list) and errors:
-            first = errors[0]
-            if isinstance(first, str):
-                return f"Error: {first}"
-            if isinstance(first, Mapping) and "message" in first:
-                msg = first.get("message")
-                if isinstance(msg, str):
-                    return f"Error: {msg}"
-        status = result.get("status")  # type: ignore[arg-type]
-        if isinstance(status, str) and status:
-            return status
-        # Agent message fallback
-        msgs = result.get("events")  # type: ignore[arg-type]
-        if isinstance(msgs, list):
-            for ev in msgs:
-                if isinstance(ev, Mapping):
-                    item = ev.get("item")
-                    if (
-                        isinstance(item, Mapping)
-                        and item.get("type") == "agent_message"
-                    ):
-                        text = item.get("text")
-                        if isinstance(text, str) and text.strip():
-                            return text
-    if isinstance(result, str):
-        return result
+    # ``type(...) is dict`` first: backends hand back plain dicts, which skips
+    # the Mapping ABC check on the common path.
+    if not (type(result) is dict or isinstance(result, Mapping)):
+        return result if isinstance(result, str) else ""
+    # Most turns end here, with ``final_message`` set.
+    for key in ("final_message", "summary"):
+        value = result.get(key)
+        if isinstance(value, str) and value.strip():
+            return value
+    # Provide a concise fallback instead of dumping the whole mapping
+    errors = result.get("errors")
+    if isinstance(errors, list) and errors:
+        first = errors[0]
+        if isinstance(first, str):
+            return f"Error: {first}"
+        if isinstance(first, Mapping) and "message" in first:
+            msg = first.get("message")
+            if isinstance(msg, str):
+                return f"Error: {msg}"
+    status = result.get("status")
+    if isinstance(status, str) and status:
+        return status
+    # Agent message fallback: scan from the end, where the closing
+    # agent_message of a turn lives.
+    msgs = result.get("events")
+    if isinstance(msgs, list):
+        for ev in reversed(msgs):
+            if type(ev) is dict or isinstance(ev, Mapping):
+                item = ev.get("item")
+                if not (type(item) is dict or isinstance(item, Mapping)):
+                    continue
+                if item.get("type") == "agent_message":
+                    text = item.get("text")
+                    if isinstance(text, str) and text.strip():
+                        return text
     return ""
 
 
@@ -1834,7 +1941,70 @@ def _print_events(events: Any) -> None:
         print(events)
 
 
+# Streaming events can arrive hundreds of times per second; cap display
+# updates at ~20 Hz and let the background ticker flush the latest message.
+_PROGRESS_MIN_INTERVAL = 0.05
+_PROGRESS_LOOP_INTERVAL = 0.1
+
+
+class _ProgressTicker:
+    """One shared thread that flushes skipped messages for every live _Progress.
+
+    The thread is started on first use and sleeps on a condition while no
+    progress display is active, so idle kernels get no wakeups.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._active: "weakref.WeakSet[_Progress]" = weakref.WeakSet()
+        self._thread: threading.Thread | None = None
+
+    def add(self, progress: "_Progress") -> None:
+        with self._cond:
+            self._active.add(progress)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def discard(self, progress: "_Progress") -> None:
+        with self._cond:
+            self._active.discard(progress)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._active:
+                    self._cond.wait()
+                self._cond.wait(_PROGRESS_LOOP_INTERVAL)
+                active = list(self._active)
+            for progress in active:
+                try:
+                    progress._catch_up()
+                except Exception:
+                    pass
+
+
+_PROGRESS_TICKER = _ProgressTicker()
+
+
 class _Progress:
+    # __weakref__ keeps instances trackable by the shared ticker's WeakSet.
+    __slots__ = (
+        "handle",
+        "handle_id",
+        "last_message",
+        "last_result_text",
+        "agent",
+        "_last_render",
+        "_rendered_message",
+        "_finished",
+        "_render_lock",
+        "_cancel",
+        "on_event",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         render: bool,
@@ -1847,15 +2017,19 @@ class _Progress:
         self.handle_id = display_id if render else None
         self.last_message = initial_message or "Working..."
         self.last_result_text: str = ""
-        self._stop = threading.Event()
+        # update() renders at most every _PROGRESS_MIN_INTERVAL seconds; the
+        # shared ticker catches up on whatever message was skipped.
+        self._last_render = 0.0
+        self._rendered_message: str | None = None
+        self._finished = False
+        self._render_lock = threading.Lock()
         self._cancel = _cancel
-        self._thread = (
-            threading.Thread(target=self._loop, daemon=True) if render else None
-        )
         self.agent = agent
-        if self._thread is not None:
-            self._thread.start()
+        # Event callback for backends: None when nothing is rendered, so
+        # _chain() leaves it out instead of summarizing every event for nothing.
+        self.on_event: Callable[[Any], None] | None = self.update if render else None
         if render:
+            _PROGRESS_TICKER.add(self)
             if display_id is None:
                 self.handle = display(HTML(""), display_id=True)
             else:
@@ -1870,35 +2044,40 @@ class _Progress:
         style = "color: #666; font-family: monospace;"
         return f'<div style="{style}">{message}</div>'
 
+    def _push(self, rendered: HTML | Markdown) -> None:
+        if self.handle_id is not None:
+            update_display(rendered, display_id=self.handle_id)
+        elif self.handle is not None:
+            self.handle.update(rendered)
+
+    def _render_message(self, message: str) -> None:
+        self._last_render = time.monotonic()
+        self._rendered_message = message
+        self._push(HTML(self._render_content(message)))
+
     def update(self, event: Any) -> None:
         msg = _summarize_event(event) or self.last_message
         self.last_message = msg
-        rendered = HTML(self._render_content(msg))
-        if self.handle_id is not None:
-            update_display(rendered, display_id=self.handle_id)
+        # An unchanged message would only re-send the same HTML to the frontend.
+        if msg == self._rendered_message:
             return
-        if self.handle is not None:
-            self.handle.update(rendered)
+        if time.monotonic() - self._last_render < _PROGRESS_MIN_INTERVAL:
+            return
+        self._render_message(msg)
 
     def update_message(self, message: str, *, markdown: bool = False) -> None:
         self.last_message = message
-        rendered: HTML | Markdown
         if markdown and not self.agent:
-            rendered = Markdown(message)
+            self._last_render = time.monotonic()
+            self._rendered_message = message
+            self._push(Markdown(message))
         else:
-            rendered = HTML(self._render_content(message))
-        if self.handle_id is not None:
-            update_display(rendered, display_id=self.handle_id)
-            return
-        if self.handle is not None:
-            self.handle.update(rendered)
+            self._render_message(message)
 
     def finish(
         self, message: str, markdown: bool = False, *, raw_html: bool = False
     ) -> None:
-        self._stop.set()
-        if self._thread is not None:
-            self._thread.join(timeout=0.5)
+        _PROGRESS_TICKER.discard(self)
         rendered: HTML | Markdown
         if raw_html:
             rendered = HTML(message)
@@ -1906,77 +2085,103 @@ class _Progress:
             rendered = Markdown(message)
         else:
             rendered = HTML(self._render_content(message))
-        if self.handle_id is not None:
-            update_display(rendered, display_id=self.handle_id)
-        elif self.handle is not None:
-            self.handle.update(rendered)
-        self.handle = None
+        # Under the lock so an in-flight catch-up can't overwrite the result.
+        with self._render_lock:
+            self._finished = True
+            self._push(rendered)
+            self.handle = None
+
+    def _catch_up(self) -> None:
+        # Only re-render when update() skipped a message; unchanged frames
+        # would just be re-sent over the kernel's display channel.
+        with self._render_lock:
+            if self._finished:
+                return
+            msg = self.last_message
+            if msg == self._rendered_message:
+                return
+            if self.handle is None and self.handle_id is None:
+                return
+            self._render_message(msg)
 
-    def _loop(self) -> None:
-        while not self._stop.is_set():
-            if self.handle is not None:
-                msg = self.last_message
-                if self.agent:
-                    self.handle.update(
-                        HTML(_render_agent_block(msg, self.agent, markdown=False))
-                    )
-                else:
-                    self.handle.update(HTML(f"<code>{msg}</code>"))
-            time.sleep(0.2)
+
+def _summarize_command(data: Mapping[str, Any]) -> str:
+    cmd = data.get("command") or ""
+    status = data.get("status") or "running"
+    return f"command ({status}): {cmd!s:.80}"
+
+
+def _summarize_input_request(event: Mapping[str, Any]) -> str:
+    prompt = event.get("prompt") or event.get("question") or ""
+    return f"awaiting input: {str(prompt)[:80] or '…'}"
+
+
+# Per-type progress summaries, looked up once per streamed event. ``!s:.N``
+# truncates while formatting, skipping the intermediate slice. Event-level
+# handlers win over an attached ``item``; _LATE_SUMMARY_HANDLERS only apply
+# when the item (if any) had no summary of its own.
+_EVENT_SUMMARY_HANDLERS: dict[str, Callable[[Mapping[str, Any]], str]] = {
+    "token": lambda ev: f"token: {ev.get('text') or ev.get('data') or ''!s:.40}",
+    "reasoning": lambda ev: f"reasoning: {ev.get('text') or ''!s:.80}",
+    "command_execution": _summarize_command,
+}
+_ITEM_SUMMARY_HANDLERS: dict[str, Callable[[Mapping[str, Any]], str]] = {
+    "reasoning": lambda item: f"reasoning: {item.get('text', '')!s:.80}",
+    "command_execution": _summarize_command,
+    "agent_message": lambda item: f"agent: {item.get('text') or ''!s:.80}",
+}
+_LATE_SUMMARY_HANDLERS: dict[str, Callable[[Mapping[str, Any]], str | None]] = {
+    "user_input.request": _summarize_input_request,
+    "ask_user_input": _summarize_input_request,
+    "ask.approval": _summarize_input_request,
+    "turn.result": lambda ev: "finalizing..." if "result" in ev else None,
+}
 
 
 def _summarize_event(event: Any) -> str:
-    if isinstance(event, dict):
-        etype = event.get("type")
-        if etype:
-            if etype == "token":
-                token = event.get("text") or event.get("data") or ""
-                return f"token: {str(token)[:40]}"
-            if etype == "reasoning":
-                text = event.get("text") or ""
-                return f"reasoning: {str(text)[:80]}"
-            if etype == "command_execution":
-                cmd = event.get("command") or ""
-                status = event.get("status") or "running"
-                return f"command ({status}): {str(cmd)[:80]}"
-            if "item" in event and isinstance(event["item"], Mapping):
-                item = event["item"]
-                item_type = item.get("type")
-                if item_type == "reasoning":
-                    return f"reasoning: {str(item.get('text', ''))[:80]}"
-                if item_type == "command_execution":
-                    cmd = item.get("command") or ""
-                    status = item.get("status") or "running"
-                    return f"command ({status}): {str(cmd)[:80]}"
-                if item_type == "agent_message":
-                    text = item.get("text") or ""
-                    return f"agent: {str(text)[:80]}"
-            # Surface interactive requests/approvals if present
-            if etype in {"user_input.request", "ask_user_input", "ask.approval"}:
-                prompt = event.get("prompt") or event.get("question") or ""
-                return f"awaiting input: {str(prompt)[:80] or '…'}"
-            if etype == "turn.result" and "result" in event:
-                return "finalizing..."
-            return str(etype)
-    return ""
+    if not isinstance(event, dict):
+        return ""
+    etype = event.get("type")
+    if not etype:
+        return ""
+    if not isinstance(etype, str):
+        return str(etype)
+    handler = _EVENT_SUMMARY_HANDLERS.get(etype)
+    if handler is not None:
+        return handler(event)
+    item = event.get("item")
+    # ``type(...) is dict`` first: decoded events are plain dicts and this
+    # skips the Mapping ABC machinery on every streamed event.
+    if type(item) is dict or isinstance(item, Mapping):
+        item_type = item.get("type")
+        item_handler = (
+            _ITEM_SUMMARY_HANDLERS.get(item_type)
+            if isinstance(item_type, str)
+            else None
+        )
+        if item_handler is not None:
+            return item_handler(item)
+    late = _LATE_SUMMARY_HANDLERS.get(etype)
+    if late is not None:
+        summary = late(event)
+        if summary is not None:
+            return summary
+    return str(etype)
 
 
-def _chain(
-    first: Callable[[Any], None] | None, second: Callable[[Any], None]
-) -> Callable[[Any], None]:
+def _chain(*callbacks: Callable[[Any], None] | None) -> Callable[[Any], None]:
+    """Combine event callbacks; a failure in one doesn't skip the others."""
+    active = tuple(cb for cb in callbacks if cb is not None)
+    if len(active) == 1:
+        # Backends already guard on_event, so a lone callback needs no wrapper.
+        return active[0]
+
     def _inner(ev: Any) -> None:
-        # Check for cancel request set by the notebook cancel button
-        if getattr(__import__("builtins"), "window", None):
-            pass  # placeholder to keep lint quiet for environments without window
-        if first is not None:
+        for cb in active:
             try:
-                first(ev)
+                cb(ev)
             except Exception:
                 pass
-        try:
-            second(ev)
-        except Exception:
-            pass
 
     return _inner
 
@@ -1985,8 +2190,14 @@ def _configure_logging(path: str | os.PathLike[str] | None) -> None:
     global _LOG_PATH
     if path is None:
         return
-    _LOG_PATH = str(path)
-    Path(_LOG_PATH).expanduser().parent.mkdir(parents=True, exist_ok=True)
+    new_path = str(path)
+    # use() is often re-run with the same log path; only create the
+    # directory when the path actually changes.
+    if new_path != _LOG_PATH:
+        log_dir = os.path.dirname(os.path.expanduser(new_path))
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+    _LOG_PATH = new_path
     os.environ["CLEON_LOG_PATH"] = _LOG_PATH
 
 
@@ -1995,70 +2206,68 @@ def _configure_cancel(path: str | os.PathLike[str] | None) -> None:
     _CANCEL_PATH = str(path) if path is not None else None
 
 
-def _log_event(event: Any) -> None:
-    if _LOG_PATH is None:
+# cleon.log is shared with the backends (_EVENT_LOG); the conversation log
+# gets one record per turn and is flushed immediately so it can be tailed.
+_CONVERSATION_LOG = _LogWriter(flush_every=1)
+atexit.register(_CONVERSATION_LOG.close)
+
+
+def _debug_enabled() -> bool:
+    """Whether cleon.log is active, i.e. debug payloads are worth building."""
+    return _LOG_PATH is not None
+
+
+def _write_log_record(payload: dict[str, Any], *, flush: bool = False) -> None:
+    path = _LOG_PATH
+    if path is None:
         return
     try:
-        payload = {"ts": time.time(), "event": event}
-        with Path(_LOG_PATH).expanduser().open("a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False))
-            f.write("\n")
+        _EVENT_LOG.write(path, _encode_json_line(payload), flush=flush)
     except Exception:
         pass
 
 
+def _log_event(event: Any) -> None:
+    if _LOG_PATH is None:
+        return
+    turn_done = (type(event) is dict or isinstance(event, Mapping)) and event.get(
+        "type"
+    ) == "turn.result"
+    _write_log_record({"ts": time.time(), "event": event}, flush=turn_done)
+
+
 def _log_events(events: Iterable[Any]) -> None:
     for ev in events:
         _log_event(ev)
 
 
 def _log_prompt(prompt: str) -> None:
-    if _LOG_PATH is None:
-        return
-    try:
-        payload = {"ts": time.time(), "type": "prompt", "data": prompt}
-        with Path(_LOG_PATH).expanduser().open("a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False))
-            f.write("\n")
-    except Exception:
-        pass
+    _write_log_record({"ts": time.time(), "type": "prompt", "data": prompt})
 
 
 def _log_template(template: str) -> None:
-    if _LOG_PATH is None:
-        return
-    try:
-        payload = {"ts": time.time(), "type": "template", "data": template}
-        with Path(_LOG_PATH).expanduser().open("a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False))
-            f.write("\n")
-    except Exception:
-        pass
+    _write_log_record({"ts": time.time(), "type": "template", "data": template})
 
 
 def _load_cleon_template(agent: str) -> str | None:
     """Load cleon.md base template and substitute {agent} and {prefix} placeholders."""
+    content = read_prompt_file("cleon.md")
+    if content is None:
+        return None
     try:
-        cleon_path = Path.cwd() / "prompts" / "cleon.md"
-        if cleon_path.exists() and cleon_path.is_file():
-            content = cleon_path.read_text(encoding="utf-8")
-            prefix = get_agent_prefix(agent)
-            return content.replace("{agent}", agent).replace("{prefix}", prefix)
+        prefix = get_agent_prefix(agent)
+        return content.replace("{agent}", agent).replace("{prefix}", prefix)
     except Exception:
-        pass
-    return None
+        return None
 
 
 def _load_mode_file(agent: str) -> str | None:
     """Load mode template file (learn.md or do.md) based on agent's default mode."""
     try:
         mode = get_default_mode(agent)
-        mode_path = Path.cwd() / "prompts" / f"{mode}.md"
-        if mode_path.exists() and mode_path.is_file():
-            return mode_path.read_text(encoding="utf-8")
     except Exception:
-        pass
-    return None
+        return None
+    return read_prompt_file(f"{mode}.md")
 
 
 def _resolve_template(agent: str) -> str | None:
@@ -2075,8 +2284,24 @@ def _resolve_template(agent: str) -> str | None:
     return template_for_agent(agent)
 
 
+_NB_NAME_CACHE: str | None = None
+
+
 def _get_notebook_name() -> str | None:
-    """Try to detect the current notebook filename."""
+    """Try to detect the current notebook filename (cached once found)."""
+    global _NB_NAME_CACHE
+    if _NB_NAME_CACHE is not None:
+        return _NB_NAME_CACHE
+    if get_ipython() is None:
+        # Not in a kernel yet; don't remember the miss.
+        return None
+    # Misses aren't cached either: an unsaved notebook has no .ipynb yet, and
+    # the session key and conversation log should pick the name up later.
+    _NB_NAME_CACHE = _detect_notebook_name()
+    return _NB_NAME_CACHE
+
+
+def _detect_notebook_name() -> str | None:
     try:
         ip = get_ipython()
         if ip is None:
@@ -2102,8 +2327,8 @@ def _configure_conversation_log() -> None:
     global _CONVERSATION_LOG_PATH
     nb_name = _get_notebook_name()
     if nb_name:
+        # Lives in the cwd, so there is no parent directory to create.
         _CONVERSATION_LOG_PATH = str(Path.cwd() / f"{nb_name}.log")
-        Path(_CONVERSATION_LOG_PATH).parent.mkdir(parents=True, exist_ok=True)
 
 
 def refresh_auto_route(ipython=None) -> None:
@@ -2147,44 +2372,30 @@ def refresh_auto_route(ipython=None) -> None:
     _install_auto_route_wrapper(ip)
 
 
+_CONVERSATION_RULE = "=" * 80
+
+
 def _log_conversation(prompt: str, response: str) -> None:
     """Log just the user prompt and assistant response to notebook-specific log."""
-    if _CONVERSATION_LOG_PATH is None:
+    path = _CONVERSATION_LOG_PATH
+    if path is None:
         return
+    rule = _CONVERSATION_RULE
+    record = f"{rule}\nUSER:\n{prompt}\n\nASSISTANT:\n{response}\n{rule}\n\n"
     try:
-        with Path(_CONVERSATION_LOG_PATH).open("a", encoding="utf-8") as f:
-            f.write(f"{'=' * 80}\n")
-            f.write(f"USER:\n{prompt}\n\n")
-            f.write(f"ASSISTANT:\n{response}\n")
-            f.write(f"{'=' * 80}\n\n")
+        _CONVERSATION_LOG.write(path, record.encode("utf-8"))
     except Exception:
         pass
 
 
 def _log_context_block(block: str) -> None:
-    if _LOG_PATH is None or not block:
+    if not block:
         return
-    try:
-        with Path(_LOG_PATH).expanduser().open("a", encoding="utf-8") as f:
-            f.write(
-                json.dumps({"type": "context.block", "data": block}, ensure_ascii=False)
-            )
-            f.write("\n")
-    except Exception:
-        pass
+    _write_log_record({"type": "context.block", "data": block})
 
 
 def _log_context_debug(payload: dict[str, Any]) -> None:
-    if _LOG_PATH is None:
-        return
-    try:
-        with Path(_LOG_PATH).expanduser().open("a", encoding="utf-8") as f:
-            f.write(
-                json.dumps({"type": "context.debug", **payload}, ensure_ascii=False)
-            )
-            f.write("\n")
-    except Exception:
-        pass
+    _write_log_record({"type": "context.debug", **payload})
 
 
 def _maybe_prompt_followup(
@@ -2209,7 +2420,7 @@ def _maybe_prompt_followup(
     agent = getattr(backend, "name", "codex")
     try:
         result, events = backend.send(
-            reply, on_event=_chain(resp_progress.update, _log_event)
+            reply, on_event=_chain(resp_progress.on_event, _log_event)
         )
     except Exception as exc:
         print(f"Failed to send reply: {exc}")
@@ -2223,45 +2434,43 @@ def _maybe_prompt_followup(
 def _prompt_user_input(question: str) -> str | None:
     """Display a blocking prompt in notebooks or fallback to stdin."""
     # Try a widget first
-    try:
-        import ipywidgets as widgets  # type: ignore
-        from IPython.display import clear_output  # type: ignore
-
-        prompt_blocks: list[widgets.Widget] = [
-            widgets.HTML(
-                value=f"<pre style='white-space: pre-wrap; font-size: 0.95em;'>{question}</pre>"
+    widgets = _load_widgets()
+    if widgets is not None:
+        try:
+            prompt_blocks: list[Any] = [
+                widgets.HTML(
+                    value=f"<pre style='white-space: pre-wrap; font-size: 0.95em;'>{question}</pre>"
+                )
+            ]
+            text = widgets.Text(
+                placeholder="Type response…",
+                description="codex:",
+                layout=widgets.Layout(width="60%"),
             )
-        ]
-        text = widgets.Text(
-            placeholder="Type response…",
-            description="codex:",
-            layout=widgets.Layout(width="60%"),
-        )
-        button = widgets.Button(description="Send", button_style="primary")
-        feedback = widgets.Output()
+            button = widgets.Button(description="Send", button_style="primary")
+            feedback = widgets.Output()
 
-        completed = threading.Event()
-        result: dict[str, str] = {"value": ""}
+            completed = threading.Event()
+            result: dict[str, str] = {"value": ""}
 
-        def finish(_: object | None = None) -> None:
-            result["value"] = text.value
-            completed.set()
+            def finish(_: object | None = None) -> None:
+                result["value"] = text.value
+                completed.set()
 
-        button.on_click(finish)
-        text.on_submit(finish)
-        prompt_blocks.append(widgets.HBox([text, button]))
-        prompt_blocks.append(feedback)
-        display(widgets.VBox(prompt_blocks))
+            button.on_click(finish)
+            text.on_submit(finish)
+            prompt_blocks.append(widgets.HBox([text, button]))
+            prompt_blocks.append(feedback)
+            display(widgets.VBox(prompt_blocks))
 
-        while not completed.wait(0.05):
-            pass
+            completed.wait()
 
-        with feedback:
-            clear_output()
-            print(f"Sent: {result['value']}")
-        return result["value"]
-    except Exception:
-        pass
+            with feedback:
+                clear_output()
+                print(f"Sent: {result['value']}")
+            return result["value"]
+        except Exception:
+            pass
 
     # Fallback to stdin
     try:
@@ -2272,18 +2481,22 @@ def _prompt_user_input(question: str) -> str | None:
         return None
 
 
+# Approval choices keyed by the number typed at the stdin fallback.
+_APPROVAL_OPTIONS: dict[str, tuple[str, str]] = {
+    "1": ("approve", "Approve"),
+    "2": ("approve_session", "Approve for session"),
+    "3": ("deny", "Deny"),
+    "4": ("abort", "Abort task"),
+}
+
+
 def _prompt_approval(event: dict[str, Any]) -> str | None:
     kind = event.get("kind", "approval")
     command = event.get("command")
     reason = event.get("reason")
     cwd = event.get("cwd")
     display_id = f"codex-approval-{uuid.uuid4().hex[:8]}"
-    options = {
-        "1": ("approve", "Approve"),
-        "2": ("approve_session", "Approve for session"),
-        "3": ("deny", "Deny"),
-        "4": ("abort", "Abort task"),
-    }
+    options = _APPROVAL_OPTIONS
     question_lines = [f"Approval request ({kind})"]
     if command:
         question_lines.append(f"Command: {command}")
@@ -2294,46 +2507,48 @@ def _prompt_approval(event: dict[str, Any]) -> str | None:
     question_text = "\n".join(question_lines)
 
     # Try widget UI first
-    try:
-        import ipywidgets as widgets  # type: ignore
-        from IPython.display import clear_output  # type: ignore
-
-        buttons: list[widgets.Button] = []
-        choice: dict[str, str | None] = {"value": None}
-        out = widgets.Output()
-
-        def handler(decision: str, label: str):
-            choice["value"] = decision
-            with out:
-                clear_output()
-                print(f"Selected: {label}")
-            for b in buttons:
-                b.disabled = True
-
-        for key, (decision, label) in options.items():
-            btn = widgets.Button(description=f"{key}. {label}", button_style="primary")
-            btn.on_click(lambda _b, d=decision, lbl=label: handler(d, lbl))
-            buttons.append(btn)
-
-        display(
-            widgets.VBox(
-                [
-                    widgets.HTML(
-                        value=f"<pre style='white-space: pre-wrap; font-size: 0.95em;'>{question_text}</pre>"
-                    ),
-                    widgets.HBox(buttons),
-                    out,
-                ]
-            ),
-            display_id=display_id,
-        )
+    widgets = _load_widgets()
+    if widgets is not None:
+        try:
+            buttons: list[Any] = []
+            choice: dict[str, str | None] = {"value": None}
+            chosen = threading.Event()
+            out = widgets.Output()
+
+            def handler(decision: str, label: str):
+                choice["value"] = decision
+                chosen.set()
+                with out:
+                    clear_output()
+                    print(f"Selected: {label}")
+                for b in buttons:
+                    b.disabled = True
+
+            for key, (decision, label) in options.items():
+                btn = widgets.Button(
+                    description=f"{key}. {label}", button_style="primary"
+                )
+                btn.on_click(lambda _b, d=decision, lbl=label: handler(d, lbl))
+                buttons.append(btn)
+
+            display(
+                widgets.VBox(
+                    [
+                        widgets.HTML(
+                            value=f"<pre style='white-space: pre-wrap; font-size: 0.95em;'>{question_text}</pre>"
+                        ),
+                        widgets.HBox(buttons),
+                        out,
+                    ]
+                ),
+                display_id=display_id,
+            )
 
-        # Wait until a button is clicked
-        while choice["value"] is None:
-            time.sleep(0.05)
-        return str(choice["value"])
-    except Exception:
-        pass
+            # Wait until a button is clicked
+            chosen.wait()
+            return str(choice["value"])
+        except Exception:
+            pass
 
     # Fallback to stdin
     try:
@@ -2422,6 +2637,36 @@ def _safe_to_text(value: Any) -> str:
             return "<unprintable output>"
 
 
+# Exact output types whose str() can be arbitrarily large but which reprlib can
+# abbreviate element by element (str() and repr() agree for these).
+_REPRLIB_CONTAINERS = (list, tuple, dict, set, frozenset, deque)
+
+
+def _bounded_text(value: Any, limit: int) -> str:
+    """Like ``_safe_to_text`` but avoids rendering huge containers in full.
+
+    A container with more than ``limit // 2`` elements can't fit in ``limit``
+    characters anyway, so it goes through reprlib with per-container element
+    caps instead of str(). Everything else, including containers small enough
+    to fit, keeps its exact str() text for the caller to truncate.
+    """
+    if (
+        limit >= sys.maxsize
+        or type(value) not in _REPRLIB_CONTAINERS
+        or len(value) <= limit // 2
+    ):
+        return _safe_to_text(value)
+    r = reprlib.Repr()
+    r.maxlist = r.maxtuple = r.maxdict = r.maxset = r.maxfrozenset = r.maxdeque = max(
+        6, limit // 2
+    )
+    r.maxstring = r.maxother = max(limit, 20)
+    try:
+        return r.repr(value)
+    except Exception:
+        return _safe_to_text(value)
+
+
 def _format_error(err: Any) -> str:
     if err is None:
         return ""
@@ -2497,10 +2742,48 @@ def _install_output_capture() -> None:
         pass
 
 
+# IPython's transformed form of cells ContextTracker leaves out: %%codex and
+# %%cleon_history cell magics, and any line magic.
+_CONTEXT_SKIP_INTERNAL = re.compile(
+    r"""run_(?:cell_magic\((['"])(?:codex|cleon_history)\1|line_magic\()"""
+)
+
+
 class ContextTracker:
+    """Collects recent notebook cells as context for agent prompts.
+
+    Filtered cell code is cached per ``In`` index, but only for the newest
+    ``_MAX_CELLS_RETAINED`` cells: older entries are dropped so a long-lived
+    kernel doesn't keep a second copy of its whole history. Windows wider
+    than that still work, they just re-filter the older cells on each call.
+    """
+
+    _MAX_CELLS_RETAINED = 200
+
     def __init__(self) -> None:
         self.last_seen_map: dict[str, int] = {}
         self._baseline = 0
+        # idx -> (source, stripped code or None when filtered out). Entries are
+        # reused only while In[idx] is the same object, so a kernel restart
+        # (fresh history) invalidates them naturally.
+        self._code_cache: dict[int, tuple[str, str | None]] = {}
+        # The shell's In/Out containers, resolved once per shell instance.
+        # IPython mutates them in place, so the references stay current.
+        self._shell: Any = None
+        self._history_ref: Any = None
+        self._outputs_ref: Any = None
+
+    def _cell_code(self, idx: int, src: str) -> str | None:
+        cached = self._code_cache.get(idx)
+        if cached is not None and cached[0] is src:
+            return cached[1]
+        text: str = src.strip()
+        # Skip %%codex, %%cleon_history, and line magics (both in magic form and IPython internal form)
+        kept: str | None = text
+        if text.startswith("%") or _CONTEXT_SKIP_INTERNAL.search(text):
+            kept = None
+        self._code_cache[idx] = (src, kept)
+        return kept
 
     def build_block(
         self,
@@ -2512,8 +2795,12 @@ class ContextTracker:
         ip = get_ipython()
         if ip is None:
             return ""
-        history = ip.user_ns.get("In", [])
-        outputs = ip.user_ns.get("Out", {})
+        if ip is not self._shell or not isinstance(self._history_ref, list):
+            self._shell = ip
+            self._history_ref = ip.user_ns.get("In", [])
+            self._outputs_ref = ip.user_ns.get("Out", {})
+        history = self._history_ref
+        outputs = self._outputs_ref
         if not isinstance(history, list):
             return ""
         agent_key = agent or "_default"
@@ -2529,75 +2816,72 @@ class ContextTracker:
             last_seen = self.last_seen_map.get(agent_key, self._baseline)
             start_idx = max(1, last_seen + 1)
 
-        cells = []
-        for idx in range(start_idx, len(history)):
-            src = history[idx]
+        if not isinstance(outputs, dict):
+            outputs = {}
+        with _CELL_OUTPUT_LOCK:
+            captured_outputs = dict(_CELL_OUTPUTS)
+
+        # One pass: each kept cell is rendered straight into ``parts``. The
+        # sliding window's start_idx already limits the scan to max_cells.
+        parts: list[str] = []
+        # A limit of sys.maxsize never truncates, so the loop needs no None checks.
+        limit = max_chars if max_chars is not None else sys.maxsize
+        debug = _debug_enabled()
+        considered: list[dict[str, Any]] = []
+        for idx, src in enumerate(history[start_idx:], start_idx):
             if not isinstance(src, str):
                 continue
-            text = src.strip()
-            # Skip %%codex, %%cleon_history, and line magics (both in magic form and IPython internal form)
-            if (
-                text.startswith("%%codex")
-                or text.startswith("%%cleon_history")
-                or text.startswith("%")  # Skip all line magics like %history
-                or "run_cell_magic('codex'" in text
-                or 'run_cell_magic("codex"' in text
-                or "run_cell_magic('cleon_history'" in text
-                or 'run_cell_magic("cleon_history"' in text
-                or "run_line_magic(" in text
-            ):  # Skip line magic internal calls
+            text = self._cell_code(idx, src)
+            if text is None:
                 continue
-            code_block = (
-                text
-                if max_chars is None or len(text) <= max_chars
-                else text[:max_chars] + "\n... [truncated]"
-            )
-            out_obj = outputs.get(idx) if isinstance(outputs, dict) else None
-            output_parts = []
-            if out_obj is not None:
-                output_parts.append(_safe_to_text(out_obj))
-
-            with _CELL_OUTPUT_LOCK:
-                captured_output = _CELL_OUTPUTS.get(idx, "")
-            if captured_output:
-                output_parts.append(captured_output)
-
-            combined_output = "\n".join(part for part in output_parts if part)
-            if max_chars is not None and len(combined_output) > max_chars:
-                combined_output = combined_output[:max_chars] + "\n... [truncated]"
+            if len(text) > limit:
+                text = text[:limit] + "\n... [truncated]"
+
+            out_obj = outputs.get(idx)
+            if out_obj is None:
+                out_text = ""
+            elif type(out_obj) is str:
+                # One char past the limit is enough to trigger the truncation
+                # marker below without holding on to the whole string.
+                out_text = out_obj[: limit + 1]
+            else:
+                out_text = _bounded_text(out_obj, limit)
+            captured_output = captured_outputs.get(idx, "")
+            if out_text and captured_output:
+                out_text = f"{out_text}\n{captured_output}"
+            elif captured_output:
+                out_text = captured_output
+            if len(out_text) > limit:
+                out_text = out_text[:limit] + "\n... [truncated]"
 
-            cells.append((idx, code_block, combined_output))
+            if out_text:
+                parts.append(f"[cell {idx}]\ncode:\n{text}\noutput:\n{out_text}")
+            else:
+                parts.append(f"[cell {idx}]\ncode:\n{text}")
+            if debug:
+                considered.append(
+                    {"idx": idx, "has_output": bool(out_text), "code_len": len(text)}
+                )
 
-        # Apply max_cells limit if in incremental mode
-        if max_cells is not None and max_cells > 0:
-            cells = cells[-max_cells:]
-
-        debug_info = {
-            "start_idx": start_idx,
-            "last_seen": self.last_seen_map.get(agent_key, self._baseline),
-            "history_len": len(history) - 1,
-            "cells_considered": [
-                {"idx": idx, "has_output": bool(out), "code_len": len(code)}
-                for idx, code, out in cells
-            ],
-            "peek": peek,
-            "sliding_window": max_cells is not None and max_cells > 0,
-            "agent": agent_key,
-        }
-        _log_context_debug(debug_info)
-        if not cells:
-            if not peek:
-                self.last_seen_map[agent_key] = baseline
-            return ""
+        if len(self._code_cache) > self._MAX_CELLS_RETAINED:
+            cutoff = len(history) - self._MAX_CELLS_RETAINED
+            for stale in [i for i in self._code_cache if i < cutoff]:
+                del self._code_cache[stale]
+
+        if debug:
+            _log_context_debug(
+                {
+                    "start_idx": start_idx,
+                    "last_seen": self.last_seen_map.get(agent_key, self._baseline),
+                    "history_len": len(history) - 1,
+                    "cells_considered": considered,
+                    "peek": peek,
+                    "sliding_window": max_cells is not None and max_cells > 0,
+                    "agent": agent_key,
+                }
+            )
         if not peek:
             self.last_seen_map[agent_key] = baseline
-        parts = []
-        for idx, code_block, out_text in cells:
-            segment = [f"[cell {idx}]", "code:", code_block]
-            if out_text:
-                segment.append("output:")
-                segment.append(out_text)
-            parts.append("\n".join(segment))
         return "\n\n".join(parts)
 
 
@@ -4,6 +4,8 @@ from __future__ import annotations
 
 import copy
 import json
+import os
+import tempfile
 from pathlib import Path
 from typing import Any, Mapping
 
@@ -91,23 +93,51 @@ DEFAULT_SETTINGS: dict[str, Any] = {
     },
 }
 
+# DEFAULT_SETTINGS is plain JSON data, so a cold load parses this snapshot
+# (in C) rather than running copy.deepcopy over the nested dicts.
+_DEFAULT_SETTINGS_JSON = json.dumps(DEFAULT_SETTINGS)
+
+
+# ($HOME, ~/.cleon) and (~/.cleon, session store path) of the last lookup.
+_CLEON_HOME: tuple[str | None, Path] | None = None
+_SESSION_STORE: tuple[Path, Path] | None = None
+
 
 def get_cleon_home() -> Path:
+    global _CLEON_HOME
+    home_env = os.environ.get("HOME")
+    cached = _CLEON_HOME
+    # Rebuild the path (and create the directory) only when HOME changes.
+    if cached is not None and cached[0] == home_env:
+        return cached[1]
     path = Path.home() / ".cleon"
     path.mkdir(parents=True, exist_ok=True)
+    _CLEON_HOME = (home_env, path)
     return path
 
 
 def get_session_store_path() -> Path:
-    return get_cleon_home() / ".cleon_session.json"
+    global _SESSION_STORE
+    home = get_cleon_home()
+    cached = _SESSION_STORE
+    if cached is not None and cached[0] is home:
+        return cached[1]
+    path = home / ".cleon_session.json"
+    _SESSION_STORE = (home, path)
+    return path
 
 
 def _deep_update(target: dict[str, Any], updates: Mapping[str, Any]) -> dict[str, Any]:
-    for key, value in updates.items():
-        if isinstance(value, Mapping) and isinstance(target.get(key), dict):
-            target[key] = _deep_update(target[key], value)
-        else:
-            target[key] = value
+    # Walk nested mappings with an explicit stack rather than recursion.
+    stack: list[tuple[dict[str, Any], Mapping[str, Any]]] = [(target, updates)]
+    while stack:
+        dst, src = stack.pop()
+        for key, value in src.items():
+            current = dst.get(key)
+            if isinstance(value, Mapping) and isinstance(current, dict):
+                stack.append((current, value))
+            else:
+                dst[key] = value
     return target
 
 
@@ -137,12 +167,28 @@ class SettingsManager:
     def __init__(self) -> None:
         self._path = get_cleon_home() / "settings.json"
         self._cache: dict[str, Any] | None = None
-
-    def load(self) -> dict[str, Any]:
-        if self._cache is not None:
-            return copy.deepcopy(self._cache)
-        data = copy.deepcopy(DEFAULT_SETTINGS)
-        if self._path.exists():
+        self._cache_stamp: tuple[int, int] | None = None
+        # settings.json is written compact by default; set CLEON_PRETTY_SETTINGS
+        # to get the indented, hand-editable layout instead.
+        self._pretty = bool(os.environ.get("CLEON_PRETTY_SETTINGS"))
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        try:
+            st = self._path.stat()
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def view(self) -> dict[str, Any]:
+        """Return the cached settings without copying; callers must not mutate.
+
+        The cache is reloaded when settings.json changes on disk.
+        """
+        stamp = self._file_stamp()
+        if self._cache is not None and stamp == self._cache_stamp:
+            return self._cache
+        data = json.loads(_DEFAULT_SETTINGS_JSON)
+        if stamp is not None:
             try:
                 raw = json.loads(self._path.read_text(encoding="utf-8"))
                 if isinstance(raw, dict):
@@ -150,18 +196,56 @@ class SettingsManager:
             except Exception:
                 pass
         self._cache = data
-        return copy.deepcopy(data)
+        self._cache_stamp = stamp
+        return data
+
+    def load(self) -> dict[str, Any]:
+        return copy.deepcopy(self.view())
+
+    def _write(self, data: dict[str, Any]) -> None:
+        if self._pretty:
+            serialized = json.dumps(data, ensure_ascii=False, indent=2)
+        else:
+            serialized = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        # Write a uniquely named sibling and swap it in so readers never see a
+        # partial file and concurrent writers can't clobber each other's tmp.
+        # Resolve first so a symlinked settings.json keeps its link.
+        target = self._path.resolve()
+        fd, tmp = tempfile.mkstemp(
+            prefix=f".{target.name}.", suffix=".tmp", dir=target.parent
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(serialized)
+            try:
+                # mkstemp creates 0600; keep the existing file's permissions.
+                os.chmod(tmp, target.stat().st_mode & 0o777)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, target)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self._cache_stamp = self._file_stamp()
 
     def save(self, data: dict[str, Any]) -> None:
-        serialized = json.dumps(data, ensure_ascii=False, indent=2)
-        self._path.write_text(serialized, encoding="utf-8")
+        self._write(data)
         self._cache = copy.deepcopy(data)
 
     def update(self, updates: Mapping[str, Any]) -> dict[str, Any]:
-        data = self.load()
-        _deep_update(data, updates)
-        self.save(data)
-        return data
+        # The cache is about to be overwritten anyway, so apply the updates to
+        # it in place instead of deep-copying it first.
+        data = self.view()
+        _deep_update(data, copy.deepcopy(dict(updates)))
+        try:
+            self._write(data)
+        except Exception:
+            self._cache = None
+            raise
+        return copy.deepcopy(data)
 
     def reset(self) -> dict[str, Any]:
         if self._path.exists():
@@ -170,6 +254,7 @@ class SettingsManager:
             except Exception:
                 pass
         self._cache = None
+        self._cache_stamp = None
         return self.load()
 
 
@@ -216,7 +301,7 @@ def settings(key: Any = _UNSET, value: Any = _UNSET, **updates: Any) -> dict[str
     # Read a single path
     if key is not _UNSET and value is _UNSET and not updates:
         path = str(key).replace("__", ".")
-        return _get_path(load_settings(), path)  # type: ignore[return-value]
+        return copy.deepcopy(_get_path(_snapshot(), path))  # type: ignore[return-value]
 
     if key is not _UNSET:
         updates[str(key)] = value
@@ -234,36 +319,56 @@ def settings(key: Any = _UNSET, value: Any = _UNSET, **updates: Any) -> dict[str
     return update_settings(flattened)
 
 
+def _snapshot() -> dict[str, Any]:
+    """Cached settings dict shared by the read-only helpers; do not mutate."""
+    return _SETTINGS_MANAGER.view()
+
+
+def _agent_view(agent: str, snap: Mapping[str, Any] | None = None) -> Mapping[str, Any]:
+    """Read-only view of one agent's settings (no copy)."""
+    if snap is None:
+        snap = _snapshot()
+    cfg = snap.get("agents", {}).get(agent, {})
+    return cfg if isinstance(cfg, Mapping) else {}
+
+
 def get_agent_settings(agent: str) -> dict[str, Any]:
-    data = load_settings()
-    agents = data.get("agents", {})
-    cfg = agents.get(agent, {})
-    return copy.deepcopy(cfg)
+    return copy.deepcopy(dict(_agent_view(agent)))
 
 
 def get_agent_prefix(agent: str) -> str:
-    cfg = get_agent_settings(agent)
-    return cfg.get("prefix") or ">"
+    return _agent_view(agent).get("prefix") or ">"
 
 
 def get_agent_binary(agent: str) -> str | None:
-    cfg = get_agent_settings(agent)
-    return cfg.get("binary")
+    return _agent_view(agent).get("binary")
 
 
-def get_default_mode(agent: str | None = None) -> str:
-    data = load_settings()
+def _default_mode_in(snap: Mapping[str, Any], agent: str | None) -> str:
     if agent:
-        agent_cfg = get_agent_settings(agent)
-        if agent_cfg.get("default_mode"):
-            return agent_cfg["default_mode"]
-    return data.get("default_mode", "learn")
+        agent_mode = _agent_view(agent, snap).get("default_mode")
+        if agent_mode:
+            return agent_mode
+    return snap.get("default_mode", "learn")
+
+
+def _mode_template_in(snap: Mapping[str, Any], mode: str) -> str | None:
+    entry = snap.get("modes", {}).get(mode)
+    if isinstance(entry, dict):
+        template = entry.get("template")
+        if isinstance(template, str) or template is None:
+            return template or _load_mode_file(mode)
+    return None
+
+
+def get_default_mode(agent: str | None = None) -> str:
+    return _default_mode_in(_snapshot(), agent)
 
 
 def settings_table() -> str:
     """Render a Markdown table summarizing key per-agent settings."""
 
-    data = load_settings()
+    data = _snapshot()
     agents = data.get("agents", {})
     rows = ["| Agent | Prefix | Model | Command |", "|---|---|---|---|"]
     for name, cfg in agents.items():
@@ -295,7 +400,7 @@ def add_mode(
 
 
 def default_mode(name: str, *, agent: str | None = None) -> dict[str, Any]:
-    settings_data = load_settings()
+    settings_data = _snapshot()
     modes = settings_data.get("modes", {})
     normalized = name.strip().lower()
     if normalized not in modes:
@@ -309,53 +414,65 @@ def default_mode(name: str, *, agent: str | None = None) -> dict[str, Any]:
 
 def plain_text_output() -> bool:
     """Return whether results should render as simple plain text instead of styled HTML."""
-    data = load_settings()
+    data = _snapshot()
     return bool(data.get("plain_text_output", False))
 
 
 def get_mode_template(mode: str) -> str | None:
-    settings_data = load_settings()
-    modes = settings_data.get("modes", {})
-    entry = modes.get(mode)
-    if isinstance(entry, dict):
-        template = entry.get("template")
-        if isinstance(template, str) or template is None:
-            return template or _load_mode_file(mode)
-    return None
+    return _mode_template_in(_snapshot(), mode)
 
 
 def template_for_agent(agent: str) -> str | None:
-    mode_name = get_default_mode(agent)
-    template = get_mode_template(mode_name)
-    return template
+    # One snapshot for both lookups instead of two view() stat checks.
+    snap = _snapshot()
+    return _mode_template_in(snap, _default_mode_in(snap, agent))
 
 
-def _load_mode_file(mode: str) -> str | None:
-    """Load a mode template from prompts/<mode>.md if present."""
+# Prompt files keyed by absolute path -> ((mtime_ns, size), text).
+_PROMPT_FILE_CACHE: dict[str, tuple[tuple[int, int], str]] = {}
+
+
+def read_prompt_file(name: str) -> str | None:
+    """Return ``prompts/<name>`` under the cwd, re-reading only when it changes.
+
+    Costs a single stat() per call once the file is cached; missing or
+    unreadable files return None.
+    """
+    path = Path.cwd() / "prompts" / name
+    key = str(path)
     try:
-        path = Path.cwd() / "prompts" / f"{mode}.md"
-        if path.exists() and path.is_file():
-            return path.read_text(encoding="utf-8")
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = _PROMPT_FILE_CACHE.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        if not path.is_file():
+            return None
+        text = path.read_text(encoding="utf-8")
     except Exception:
-        pass
-    return None
+        _PROMPT_FILE_CACHE.pop(key, None)
+        return None
+    _PROMPT_FILE_CACHE[key] = (stamp, text)
+    return text
+
+
+def _load_mode_file(mode: str) -> str | None:
+    """Load a mode template from prompts/<mode>.md if present."""
+    return read_prompt_file(f"{mode}.md")
 
 
 def status_summary() -> dict[str, Any]:
-    data = load_settings()
+    data = _snapshot()
     return {
         "default_agent": data.get("default_agent", "codex"),
-        "agents": data.get("agents", {}),
-        "modes": data.get("modes", {}),
+        "agents": copy.deepcopy(data.get("agents", {})),
+        "modes": copy.deepcopy(data.get("modes", {})),
         "default_mode": data.get("default_mode", "learn"),
     }
 
 
 def get_agent_theme(agent: str) -> dict[str, str]:
-    data = load_settings()
-    agents = data.get("agents", {})
-    entry = agents.get(agent, {})
-    theme = entry.get("theme")
+    theme = _agent_view(agent).get("theme")
     if isinstance(theme, dict):
         return {str(k): str(v) for k, v in theme.items()}
     return {}
@@ -0,0 +1,74 @@
+"""Shared pytest fixtures."""
+
+import sys
+import types
+
+import pytest
+
+
+class MockIPython:
+    """Minimal stand-in for an IPython shell that records magic registration."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.magics_manager = type("obj", (object,), {"magics": {"cell": {}}})()
+        self.registered = []
+        self.user_ns = {"In": [], "Out": {}}
+
+    def register_magic_function(self, func, magic_kind, magic_name):
+        self.registered.append(magic_name)
+        if magic_kind == "cell":
+            self.magics_manager.magics["cell"][magic_name] = func
+
+
+@pytest.fixture(scope="session")
+def _shared_mock_ipython():
+    return MockIPython()
+
+
+@pytest.fixture
+def mock_ipython(_shared_mock_ipython):
+    """The session's MockIPython, reset to a clean state for this test."""
+    _shared_mock_ipython.reset()
+    return _shared_mock_ipython
+
+
+@pytest.fixture
+def ipython_module(monkeypatch, mock_ipython):
+    """Install a fake ``IPython`` package whose get_ipython() is ``mock_ipython``.
+
+    The real modules (if any) are restored by ``monkeypatch`` on teardown.
+    """
+    module = types.ModuleType("IPython")
+    module.get_ipython = lambda: mock_ipython
+    display = types.ModuleType("IPython.display")
+    display.display = lambda *args, **kwargs: None
+    display.update_display = lambda *args, **kwargs: None
+    display.HTML = lambda data: None
+    display.Markdown = lambda data: None
+    module.display = display
+    monkeypatch.setitem(sys.modules, "IPython", module)
+    monkeypatch.setitem(sys.modules, "IPython.display", display)
+    return mock_ipython
+
+
+def _is_cleon_module(name: str) -> bool:
+    return name == "cleon" or name.startswith("cleon.")
+
+
+@pytest.fixture
+def isolated_cleon(monkeypatch):
+    """Give the test a fresh ``cleon`` import and restore the previous one after.
+
+    Already-imported cleon modules are unloaded through ``monkeypatch`` so they
+    are put back on teardown; anything the test itself imports is dropped.
+    """
+    for name in [k for k in sys.modules if _is_cleon_module(k)]:
+        monkeypatch.delitem(sys.modules, name)
+    before = set(sys.modules)
+    yield
+    for name in set(sys.modules) - before:
+        if _is_cleon_module(name):
+            sys.modules.pop(name, None)
@@ -7,24 +7,428 @@ class DummyProc:
     def __init__(self, rfile):
         self.stdout = rfile
         self.stdin = None
+        self.stderr = None
 
 
 def test_drain_stdout_consumes_pipe():
     # Create a pipe with some data and ensure _drain_stdout does not block
     rfd, wfd = os.pipe()
-    rfile = os.fdopen(rfd, "r", buffering=1)
-    wfile = os.fdopen(wfd, "w", buffering=1)
-    wfile.write("line1\nline2\n")
+    rfile = os.fdopen(rfd, "rb")
+    wfile = os.fdopen(wfd, "wb")
+    wfile.write(b'line1\n{"session_id": "abc"}\n')
     wfile.flush()
     wfile.close()
 
-    sess = SharedSession.__new__(SharedSession)  # bypass __init__
-    sess.proc = DummyProc(rfile)
+    sess = SharedSession("cleon")
+    sess.proc = DummyProc(rfile)  # type: ignore[assignment]
+    sess._start_readers()
+    assert sess._stdout_thread is not None
+    sess._stdout_thread.join(timeout=2.0)
 
     # Should return quickly and consume the pending lines
-    sess._drain_stdout()
+    sess._drain_stdout(capture_metadata=True)
 
-    # The reader should now be at EOF
-    assert rfile.readline() == ""
+    # The reader should now be at EOF with only the EOF marker left queued
+    assert rfile.readline() == b""
+    assert sess._queue.get_nowait() is None
+    assert sess.session_id == "abc"
 
     rfile.close()
+
+
+def test_bounded_text_keeps_small_containers_exact():
+    from cleon.magic import _bounded_text
+
+    for value in ({"b": 1, "a": 2}, [[[[1]]]], list(range(150)), ["x" * 100]):
+        assert _bounded_text(value, 1000) == str(value)
+
+    # Only containers too long to fit the limit are abbreviated.
+    text = _bounded_text(list(range(1_000_000)), 2000)
+    assert text.startswith("[0, 1, 2, ") and text.endswith("...]")
+    assert len(text) < 10_000
+
+
+def test_log_writer_flushes_and_closes(monkeypatch, tmp_path):
+    import cleon.magic as magic
+
+    clock = [10_000.0]
+    monkeypatch.setattr(magic.time, "monotonic", lambda: clock[0])
+    path = tmp_path / "cleon.log"
+    writer = magic._LogWriter(flush_every=3, flush_interval=0.5)
+    writer.write(str(path), b"a\n")
+    writer.write(str(path), b"b\n")
+    assert path.read_bytes() == b""  # still buffered
+    writer.write(str(path), b"c\n")
+    assert path.read_bytes() == b"a\nb\nc\n"
+    writer.write(str(path), b"d\n", flush=True)
+    assert path.read_bytes().endswith(b"d\n")
+    writer.write(str(path), b"e\n")
+    assert path.read_bytes().endswith(b"d\n")
+    clock[0] += 1.0  # past flush_interval since the last flush
+    writer.write(str(path), b"f\n")
+    assert path.read_bytes().endswith(b"e\nf\n")
+    writer.write(str(path), b"g\n")
+    writer.close()
+    assert path.read_bytes() == b"a\nb\nc\nd\ne\nf\ng\n"
+    assert writer._fh is None
+
+    # Unbuffered mode writes each record straight through.
+    unbuffered = magic._LogWriter(flush_every=1)
+    unbuffered.write(str(path), b"h\n")
+    assert path.read_bytes().endswith(b"h\n")
+    unbuffered.close()
+
+
+def test_backend_and_magic_records_share_one_log(monkeypatch, tmp_path):
+    import json
+
+    import cleon.backend as backend
+    import cleon.magic as magic
+
+    path = tmp_path / "cleon.log"
+    monkeypatch.setattr(magic, "_LOG_PATH", str(path))
+    # A relative spelling of the same file must resolve to the same handle.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CLEON_LOG_PATH", "cleon.log")
+    monkeypatch.setattr(backend, "_EVENT_LOG", backend._LogWriter(flush_every=64))
+    monkeypatch.setattr(magic, "_EVENT_LOG", backend._EVENT_LOG)
+
+    magic._write_log_record({"n": 1})
+    magic._write_log_record({"n": 2})
+    backend._log_backend_event("codex", "tick", {"n": 3})
+    magic._write_log_record({"n": 4})
+    backend._log_backend_event("codex", "tick", {"n": 5})
+    backend._EVENT_LOG.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["n"] for r in records] == [1, 2, 3, 4, 5]
+
+
+def test_iter_pipe_lines_joins_partial_reads(monkeypatch):
+    import cleon.backend as backend
+
+    # Tiny reads force lines to straddle several os.read() chunks.
+    monkeypatch.setattr(backend, "_READ_CHUNK", 4)
+    rfd, wfd = os.pipe()
+    with os.fdopen(wfd, "wb") as wfile:
+        wfile.write(b'{"a": 1}\n{"bb": 22}\ntrailing-no-newline')
+    with os.fdopen(rfd, "rb") as rfile:
+        lines = list(backend._iter_pipe_lines(rfile))
+    assert lines == [b'{"a": 1}', b'{"bb": 22}', b"trailing-no-newline"]
+
+
+def test_iter_pipe_lines_fallback_yields_bytes():
+    import io
+
+    from cleon.backend import _iter_pipe_lines
+
+    assert list(_iter_pipe_lines(io.StringIO('{"a": 1}\n  x  \n'))) == [
+        b'{"a": 1}',
+        b"x",
+    ]
+    assert list(_iter_pipe_lines(io.BytesIO(b"one\ntwo"))) == [b"one", b"two"]
+
+
+def test_prefix_matcher_tracks_rule_changes():
+    import cleon.magic as magic
+
+    rules = {"@": ("codex", "codex")}
+    assert magic._line_has_agent_prefix("# @codex hi", rules) == (
+        "# @",
+        "@",
+        "codex",
+    )
+    # The rules dict is refilled in place on reconfiguration.
+    rules.clear()
+    rules["~"] = ("claude", "claude")
+    assert magic._line_has_agent_prefix("@ hi", rules) is None
+    assert magic._line_has_agent_prefix("~claude hi", rules) == ("~", "~", "claude")
+
+    # The matcher cache is bounded: it resets rather than growing forever.
+    magic._PREFIX_MATCHERS.clear()
+    for i in range(8):
+        magic._prefix_matcher({f"!{i}": ("", f"m{i}")})
+    assert len(magic._PREFIX_MATCHERS) == 8
+    magic._prefix_matcher({"!8": ("", "m8")})
+    assert len(magic._PREFIX_MATCHERS) == 1
+
+
+def test_context_tracker_code_cache_follows_in_entries(monkeypatch):
+    import cleon.magic as magic
+
+    history = ["", "x = 1", "%time y", "z = 3"]
+    shell = type("Shell", (), {"user_ns": {"In": history, "Out": {}}})()
+    monkeypatch.setattr(magic, "get_ipython", lambda: shell)
+
+    tracker = magic.ContextTracker()
+    block = tracker.build_block(10, None, None, peek=True)
+    assert "x = 1" in block and "z = 3" in block and "%time" not in block
+    assert tracker._code_cache[1][0] is history[1]
+
+    # A replaced In entry (e.g. fresh history after a restart) is re-filtered.
+    history[1] = "w = 2"
+    block = tracker.build_block(10, None, None, peek=True)
+    assert "w = 2" in block and "x = 1" not in block
+    assert tracker._code_cache[1] == ("w = 2", "w = 2")
+
+
+def test_settings_view_reloads_on_file_change(monkeypatch, tmp_path):
+    import importlib
+    import json
+
+    settings = importlib.import_module("cleon.settings")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    manager = settings.SettingsManager()
+    path = tmp_path / ".cleon" / "settings.json"
+
+    path.write_text(json.dumps({"default_agent": "claude"}), encoding="utf-8")
+    first = manager.view()
+    assert first["default_agent"] == "claude"
+    assert manager.view() is first  # unchanged file: cached object
+
+    path.write_text(json.dumps({"default_agent": "gemini!"}), encoding="utf-8")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert manager.view()["default_agent"] == "gemini!"
+
+
+def test_read_prompt_file_invalidates_on_change(monkeypatch, tmp_path):
+    import importlib
+
+    settings = importlib.import_module("cleon.settings")
+    monkeypatch.chdir(tmp_path)
+    prompt = tmp_path / "prompts" / "learn.md"
+    prompt.parent.mkdir()
+
+    assert settings.read_prompt_file("learn.md") is None
+    prompt.write_text("v1", encoding="utf-8")
+    assert settings.read_prompt_file("learn.md") == "v1"
+
+    prompt.write_text("v2", encoding="utf-8")
+    st = prompt.stat()
+    os.utime(prompt, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert settings.read_prompt_file("learn.md") == "v2"
+
+    prompt.unlink()
+    assert settings.read_prompt_file("learn.md") is None
+
+
+def test_resolve_cleon_binary_caches_until_file_disappears(monkeypatch, tmp_path):
+    import cleon.backend as backend
+
+    binary = tmp_path / "cleon"
+    binary.write_text("")
+    probes = []
+
+    def candidates(explicit, env_value):
+        probes.append(explicit)
+        yield explicit
+
+    monkeypatch.delenv("CLEON_BIN", raising=False)
+    monkeypatch.setattr(backend, "_CLEON_BINARY_CACHE", {})
+    monkeypatch.setattr(backend, "_cleon_binary_candidates", candidates)
+
+    assert backend._resolve_cleon_binary(str(binary)) == str(binary)
+    assert backend._resolve_cleon_binary(str(binary)) == str(binary)
+    assert len(probes) == 1  # second lookup served from the cache
+
+    # A cached path that no longer exists triggers a fresh probe.
+    binary.unlink()
+    assert backend._resolve_cleon_binary(str(binary)) is None
+    assert len(probes) == 2
+
+
+def test_settings_write_is_atomic_and_keeps_symlinks(monkeypatch, tmp_path):
+    import importlib
+    import json
+
+    import pytest
+
+    settings = importlib.import_module("cleon.settings")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("CLEON_PRETTY_SETTINGS", raising=False)
+    manager = settings.SettingsManager()
+    home = tmp_path / ".cleon"
+
+    # settings.json symlinked elsewhere (e.g. a dotfiles repo) stays a link.
+    real = tmp_path / "dotfiles-settings.json"
+    real.write_text("{}", encoding="utf-8")
+    os.chmod(real, 0o640)
+    (home / "settings.json").symlink_to(real)
+
+    manager.save({"default_agent": "claude"})
+    assert (home / "settings.json").is_symlink()
+    assert json.loads(real.read_text(encoding="utf-8")) == {"default_agent": "claude"}
+    assert "\n" not in real.read_text(encoding="utf-8")  # compact by default
+    assert real.stat().st_mode & 0o777 == 0o640
+    assert sorted(p.name for p in home.iterdir()) == ["settings.json"]
+    assert sorted(p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")) == []
+
+    # A failed swap leaves the old file intact and no tmp file behind.
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(settings.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        manager.save({"default_agent": "gemini"})
+    assert json.loads(real.read_text(encoding="utf-8")) == {"default_agent": "claude"}
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_notebook_name_cached_only_once_found(monkeypatch):
+    import cleon.magic as magic
+
+    found = [None]
+    calls = []
+
+    def detect():
+        calls.append(1)
+        return found[0]
+
+    monkeypatch.setattr(magic, "_NB_NAME_CACHE", None)
+    monkeypatch.setattr(magic, "get_ipython", lambda: object())
+    monkeypatch.setattr(magic, "_detect_notebook_name", detect)
+
+    # Before the notebook is saved there is nothing to find; keep looking.
+    assert magic._get_notebook_name() is None
+    assert magic._get_notebook_name() is None
+    assert len(calls) == 2
+
+    found[0] = "analysis"
+    assert magic._get_notebook_name() == "analysis"
+    found[0] = "other"
+    assert magic._get_notebook_name() == "analysis"
+    assert len(calls) == 3
+
+
+def _progress_harness(monkeypatch):
+    import cleon.magic as magic
+
+    class NoTicker:
+        def add(self, progress):
+            pass
+
+        def discard(self, progress):
+            pass
+
+    clock = [1_000.0]
+    pushed = []
+    monkeypatch.setattr(magic.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(magic, "_PROGRESS_TICKER", NoTicker())
+    monkeypatch.setattr(
+        magic, "update_display", lambda obj, display_id=None: pushed.append(obj)
+    )
+    progress = magic._Progress(render=True, display_id="p", initial_message="start")
+    return progress, clock, pushed
+
+
+def test_progress_rate_limits_and_catches_up(monkeypatch):
+    progress, clock, pushed = _progress_harness(monkeypatch)
+    baseline = len(pushed)
+
+    # Within _PROGRESS_MIN_INTERVAL of the last render: remembered, not drawn.
+    progress.update({"type": "reasoning", "text": "a"})
+    assert len(pushed) == baseline
+    assert progress.last_message == "reasoning: a"
+
+    # The ticker's catch-up draws the skipped message.
+    progress._catch_up()
+    assert len(pushed) == baseline + 1
+
+    # Once the interval has passed, update() renders directly.
+    clock[0] += 1.0
+    progress.update({"type": "reasoning", "text": "b"})
+    assert len(pushed) == baseline + 2
+
+    # After finish() a late catch-up must not overwrite the final output.
+    progress.last_message = "late"
+    progress.finish("done")
+    count = len(pushed)
+    progress._catch_up()
+    assert len(pushed) == count
+
+
+def test_progress_skips_unchanged_messages(monkeypatch):
+    progress, clock, pushed = _progress_harness(monkeypatch)
+    clock[0] += 1.0
+    progress.update({"type": "reasoning", "text": "a"})
+    count = len(pushed)
+
+    # Same summary again: nothing is re-sent, however much time passed.
+    clock[0] += 1.0
+    progress.update({"type": "reasoning", "text": "a"})
+    progress._catch_up()
+    assert len(pushed) == count
+    progress.update({"type": "reasoning", "text": "b"})
+    assert len(pushed) == count + 1
+
+
+def test_progress_ticker_drives_active_displays(monkeypatch):
+    import gc
+    import threading
+    import time
+
+    import cleon.magic as magic
+
+    monkeypatch.setattr(magic, "_PROGRESS_LOOP_INTERVAL", 0.01)
+    ticked = threading.Event()
+
+    class Display:
+        def _catch_up(self):
+            ticked.set()
+
+    ticker = magic._ProgressTicker()
+    display = Display()
+    ticker.add(display)
+    assert ticked.wait(2.0)
+
+    # Discarded displays are no longer caught up.
+    ticker.discard(display)
+    ticked.clear()
+    assert not ticked.wait(0.1)
+
+    # The ticker holds only weak references, so dropped displays fall out.
+    ticker.add(Display())
+    deadline = time.monotonic() + 2.0
+    while len(ticker._active) and time.monotonic() < deadline:
+        gc.collect()
+        time.sleep(0.01)
+    assert len(ticker._active) == 0
+
+
+_FAKE_CLI = """\
+import json, sys
+print(json.dumps({"type": "session.start", "session_id": "s1"}), flush=True)
+for line in sys.stdin:
+    if line.strip() == "__CLEON_STOP__":
+        break
+    for i in range(3):
+        item = {"type": "reasoning", "text": f"t{i}"}
+        print(json.dumps({"type": "item.completed", "item": item}), flush=True)
+    result = {"final_message": "echo: " + line.strip()}
+    print(json.dumps({"type": "turn.result", "result": result}), flush=True)
+"""
+
+
+def test_send_without_collecting_events(tmp_path):
+    import sys
+
+    script = tmp_path / "fake-cleon"
+    script.write_text(f"#!{sys.executable}\n{_FAKE_CLI}")
+    script.chmod(0o755)
+
+    sess = SharedSession(str(script))
+    try:
+        seen = []
+        final, events = sess.send("hi", on_event=seen.append, collect_events=False)
+        assert final == {"final_message": "echo: hi"}
+        assert events == []  # nothing retained...
+        assert [ev["type"] for ev in seen].count(
+            "item.completed"
+        ) == 3  # ...but streamed
+
+        final, events = sess.send("again")
+        assert final == {"final_message": "echo: again"}
+        assert [ev["type"] for ev in events] == ["item.completed"] * 3 + ["turn.result"]
+    finally:
+        sess.stop()
@@ -3,36 +3,11 @@
 import os
 import sys
 import tempfile
-import types
 from pathlib import Path
 
+import pytest
 
-def _setup_mock_ipython():
-    """Set up mock IPython module for testing."""
-
-    class MockIPython:
-        def __init__(self):
-            self.magics_manager = type("obj", (object,), {"magics": {"cell": {}}})()
-            self.registered = []
-            self.user_ns = {"In": [], "Out": {}}
-
-        def register_magic_function(self, func, magic_kind, magic_name):
-            self.registered.append(magic_name)
-            if magic_kind == "cell":
-                self.magics_manager.magics["cell"][magic_name] = func
-
-    mock_ip = MockIPython()
-    mock_ipython = types.ModuleType("IPython")
-    mock_ipython.get_ipython = lambda: mock_ip
-    mock_ipython.display = types.ModuleType("IPython.display")
-    mock_ipython.display.display = lambda *args, **kwargs: None
-    mock_ipython.display.update_display = lambda *args, **kwargs: None
-    mock_ipython.display.HTML = lambda data: None
-    mock_ipython.display.Markdown = lambda data: None
-
-    sys.modules["IPython"] = mock_ipython
-    sys.modules["IPython.display"] = mock_ipython.display
-    return mock_ip
+pytestmark = pytest.mark.usefixtures("ipython_module", "isolated_cleon")
 
 
 class TestTemplateLoading:
@@ -40,7 +15,6 @@ class TestTemplateLoading:
 
     def test_load_cleon_template_substitutes_agent(self):
         """Test that {agent} placeholder is substituted."""
-        _setup_mock_ipython()
 
         with tempfile.TemporaryDirectory() as tmpdir:
             prompts_dir = Path(tmpdir) / "prompts"
@@ -53,10 +27,6 @@ class TestTemplateLoading:
             try:
                 os.chdir(tmpdir)
 
-                mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-                for mod in mods_to_remove:
-                    del sys.modules[mod]
-
                 from cleon.magic import _load_cleon_template
 
                 result = _load_cleon_template("claude")
@@ -68,7 +38,6 @@ class TestTemplateLoading:
 
     def test_load_cleon_template_substitutes_prefix(self):
         """Test that {prefix} placeholder is substituted."""
-        _setup_mock_ipython()
 
         with tempfile.TemporaryDirectory() as tmpdir:
             prompts_dir = Path(tmpdir) / "prompts"
@@ -81,10 +50,6 @@ class TestTemplateLoading:
             try:
                 os.chdir(tmpdir)
 
-                mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-                for mod in mods_to_remove:
-                    del sys.modules[mod]
-
                 from cleon.magic import _load_cleon_template
 
                 result = _load_cleon_template("codex")
@@ -95,7 +60,6 @@ class TestTemplateLoading:
 
     def test_load_mode_file(self):
         """Test loading mode-specific template file."""
-        _setup_mock_ipython()
 
         with tempfile.TemporaryDirectory() as tmpdir:
             prompts_dir = Path(tmpdir) / "prompts"
@@ -108,10 +72,6 @@ class TestTemplateLoading:
             try:
                 os.chdir(tmpdir)
 
-                mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-                for mod in mods_to_remove:
-                    del sys.modules[mod]
-
                 from cleon.magic import _load_mode_file
 
                 result = _load_mode_file("codex")
@@ -122,7 +82,6 @@ class TestTemplateLoading:
 
     def test_resolve_template_combines_cleon_and_mode(self):
         """Test that _resolve_template combines cleon.md and mode file."""
-        _setup_mock_ipython()
 
         with tempfile.TemporaryDirectory() as tmpdir:
             prompts_dir = Path(tmpdir) / "prompts"
@@ -138,10 +97,6 @@ class TestTemplateLoading:
             try:
                 os.chdir(tmpdir)
 
-                mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-                for mod in mods_to_remove:
-                    del sys.modules[mod]
-
                 from cleon.magic import _resolve_template
 
                 result = _resolve_template("claude")
@@ -157,11 +112,6 @@ class TestMixedCellDetection:
 
     def test_detect_mixed_cell_with_at_prefix(self):
         """Test detecting cell with Python code followed by @ query."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         from cleon.magic import _detect_mixed_cell
 
@@ -177,11 +127,6 @@ print(x)
 
     def test_detect_mixed_cell_with_commented_prefix(self):
         """Test detecting cell with commented agent prefix."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         from cleon.magic import _detect_mixed_cell
 
@@ -197,11 +142,6 @@ print(x)
 
     def test_detect_mixed_cell_no_agent_prefix(self):
         """Test that pure Python cells return None."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         from cleon.magic import _detect_mixed_cell
 
@@ -221,11 +161,6 @@ class TestAgentPrefixDetection:
 
     def test_at_prefix_detection(self):
         """Test @ prefix is detected."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         from cleon.magic import _line_has_agent_prefix
 
@@ -240,11 +175,6 @@ class TestAgentPrefixDetection:
 
     def test_tilde_prefix_detection(self):
         """Test ~ prefix is detected."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         from cleon.magic import _line_has_agent_prefix
 
@@ -259,11 +189,6 @@ class TestAgentPrefixDetection:
 
     def test_commented_prefix_detection(self):
         """Test # @ commented prefix is detected."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         from cleon.magic import _line_has_agent_prefix
 
@@ -278,11 +203,6 @@ class TestAgentPrefixDetection:
 
     def test_no_prefix_returns_none(self):
         """Test that lines without agent prefix return None."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         from cleon.magic import _line_has_agent_prefix
 
@@ -297,15 +217,10 @@ class TestExtensionDetection:
 
     def test_has_extension_false_when_not_installed(self):
         """Test has_extension returns False when extension not installed."""
-        _setup_mock_ipython()
 
         if "cleon_cell_control" in sys.modules:
             del sys.modules["cleon_cell_control"]
 
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
-
         try:
             import cleon
 
@@ -316,11 +231,6 @@ class TestExtensionDetection:
 
     def test_has_extension_returns_bool(self):
         """Test has_extension always returns a boolean."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         import cleon
 
@@ -333,11 +243,6 @@ class TestVersionCheck:
 
     def test_get_current_version_returns_string(self):
         """Test _get_current_version returns a string."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         import cleon
 
@@ -347,17 +252,28 @@ class TestVersionCheck:
 
     def test_is_uv_environment_returns_bool(self):
         """Test _is_uv_environment returns a boolean."""
-        _setup_mock_ipython()
-
-        mods_to_remove = [k for k in sys.modules if k.startswith("cleon")]
-        for mod in mods_to_remove:
-            del sys.modules[mod]
 
         import cleon
 
         result = cleon._is_uv_environment()
         assert isinstance(result, bool)
 
+    def test_venv_created_by_uv_reads_pyvenv_cfg(self, monkeypatch, tmp_path):
+        """uv on PATH alone must not make install_extension run uv."""
+        import shutil
+
+        import cleon
+
+        monkeypatch.setattr(shutil, "which", lambda name: "/usr/bin/uv")
+        monkeypatch.setattr(sys, "prefix", str(tmp_path))
+        cfg = tmp_path / "pyvenv.cfg"
+
+        assert cleon._venv_created_by_uv() is False
+        cfg.write_text("home = /usr/bin\nversion = 3.12.0\n")
+        assert cleon._venv_created_by_uv() is False
+        cfg.write_text("home = /usr/bin\nuv = 0.4.18\n")
+        assert cleon._venv_created_by_uv() is True
+
     def test_version_parsing(self):
         """Test version comparison logic."""
 
@@ -374,3 +290,41 @@ class TestVersionCheck:
         assert _parse_version("0.2.0") > _parse_version("0.1.11")
         assert _parse_version("1.0.0") > _parse_version("0.9.99")
         assert _parse_version("0.1.11") == _parse_version("0.1.11")
+
+    def test_is_newer_version_handles_prereleases(self):
+        """Test version comparison tolerates non-numeric segments."""
+
+        import cleon
+
+        assert cleon._is_newer_version("0.2.0", "0.1.11")
+        assert not cleon._is_newer_version("0.1.11", "0.1.11")
+        assert cleon._is_newer_version("0.1.12", "0.1.12rc1")
+        assert not cleon._is_newer_version("0.1.12rc1", "0.1.12")
+
+    def test_is_newer_version_without_packaging(self, monkeypatch):
+        """Test the numeric fallback used when packaging is unavailable."""
+        import cleon
+
+        monkeypatch.setitem(sys.modules, "packaging.version", None)
+        assert cleon._is_newer_version("0.2.0", "0.1.11")
+        assert cleon._is_newer_version("1.0", "0.9.99")
+        assert not cleon._is_newer_version("0.1.11", "0.1.11")
+        assert not cleon._is_newer_version("0.1.10", "0.1.11")
+
+    def test_get_current_version_looked_up_once(self, monkeypatch):
+        """Test the installed version is resolved from metadata only once."""
+        import importlib.metadata
+
+        import cleon
+
+        calls = []
+
+        def fake_version(name):
+            calls.append(name)
+            return "9.9.9"
+
+        monkeypatch.setattr(importlib.metadata, "version", fake_version)
+        monkeypatch.setattr(cleon, "_CURRENT_VERSION", None)
+        assert cleon._get_current_version() == "9.9.9"
+        assert cleon._get_current_version() == "9.9.9"
+        assert calls == ["cleon"]